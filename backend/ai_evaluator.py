@@ -1,16 +1,98 @@
 import os
-from groq import Groq
+import random
+import re
+import threading
+import time
+from groq import Groq, APIConnectionError, APIStatusError
 from dotenv import load_dotenv
+from rate_limit import TokenBucket
+from metrics import track_call, add_tokens
+from services import groq_client
+from resume_compactor import estimate_tokens
 
 load_dotenv()
 
 # ✅ Get API key from environment (Render-compatible)
 API_KEY = os.environ.get("GROQ_API_KEY")
 
-if not API_KEY:
-    raise RuntimeError("GROQ_API_KEY environment variable not set")
+# ---------- RATE LIMITING ----------
+# Defaults match the Groq free tier for llama-3.1-8b-instant; 0 disables a limit
+GROQ_RPM = int(os.environ.get("GROQ_RPM", "30"))
+GROQ_TPM = int(os.environ.get("GROQ_TPM", "6000"))
+GROQ_MAX_IN_FLIGHT = int(os.environ.get("GROQ_MAX_IN_FLIGHT", "4"))
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", "5"))
+GROQ_TIMEOUT = float(os.environ.get("GROQ_TIMEOUT", "30"))
 
-client = Groq(api_key=API_KEY)
+MODEL = "llama-3.1-8b-instant"
+
+request_bucket = TokenBucket(GROQ_RPM)
+token_bucket = TokenBucket(GROQ_TPM)
+_in_flight = threading.BoundedSemaphore(max(1, GROQ_MAX_IN_FLIGHT))
+
+
+def build_client() -> Groq:
+    """The real Groq client (services.groq_client() decides which one is used)."""
+    if not API_KEY:
+        raise RuntimeError("GROQ_API_KEY environment variable not set")
+    # Retries are handled below so they share the rate limiter with everyone else
+    return Groq(api_key=API_KEY, max_retries=0, timeout=GROQ_TIMEOUT)
+
+
+def _estimate_tokens(messages: list, max_tokens: int) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages) + max_tokens
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Retry-After if the server sent one, otherwise exponential backoff with full jitter."""
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return random.uniform(0, min(60, 2 ** attempt))
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+
+def complete(messages: list, max_tokens: int = 16) -> str:
+    """
+    Run one chat completion under the shared RPM/TPM buckets and in-flight limit,
+    retrying 429/5xx/connection errors. Safe to call from many worker threads.
+    """
+    estimate = _estimate_tokens(messages, max_tokens)
+    for attempt in range(GROQ_MAX_RETRIES + 1):
+        request_bucket.acquire()
+        token_bucket.acquire(estimate)
+        try:
+            with _in_flight, track_call("groq", "chat.completions"):
+                response = groq_client().chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    temperature=0,
+                    max_tokens=max_tokens
+                )
+        except Exception as e:
+            if attempt == GROQ_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retry_delay(e, attempt)
+            if isinstance(e, APIStatusError) and e.status_code == 429:
+                # Everyone is over quota, not just this call
+                request_bucket.pause(delay)
+                token_bucket.pause(delay)
+            print(f"Groq call failed ({e}), retry {attempt + 1}/{GROQ_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if response.usage is not None:
+            token_bucket.adjust(estimate - response.usage.total_tokens)
+            add_tokens(response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content.strip()
 
 
 def check_resume(resume_text: str, role_name: str = "Software Engineer", requirements: str = "Programming skills AND CS/IT education") -> str:
@@ -33,13 +115,97 @@ Resume:
 {resume_text}
 """
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
+    return complete([
+        {"role": "system", "content": f"You are a strict technical recruiter evaluating for a {role_name} role."},
+        {"role": "user", "content": prompt}
+    ])
+
+
+# ---------- BATCHED EVALUATION ----------
+# Each resume is cut to this many characters when several share one request
+BATCH_RESUME_CHARS = int(os.environ.get("BATCH_RESUME_CHARS", "6000"))
+# Answer tokens per candidate line ("12: NOT ELIGIBLE"), plus room for a preamble the model may add
+BATCH_TOKENS_PER_CANDIDATE = 8
+BATCH_ANSWER_HEADROOM = 48
+
+_VERDICT_LINE = re.compile(r"^\W*(?:candidate\s*)?#?(\d+)\s*[:.)\-]\s*(NOT ELIGIBLE|ELIGIBLE)\b", re.IGNORECASE | re.MULTILINE)
+
+
+def parse_batch_verdicts(content: str, count: int) -> dict:
+    """
+    Parse "<n>: ELIGIBLE / NOT ELIGIBLE" lines into {index: decision} (0-based).
+    Numbers outside 1..count and candidates with conflicting answers are left out.
+    """
+    verdicts = {}
+    conflicts = set()
+    for number, decision in _VERDICT_LINE.findall(content or ""):
+        index = int(number) - 1
+        if not 0 <= index < count:
+            continue
+        decision = decision.upper()
+        if index in verdicts and verdicts[index] != decision:
+            conflicts.add(index)
+        verdicts[index] = decision
+    for index in conflicts:
+        del verdicts[index]
+    return verdicts
+
+
+def _evaluate_batch(resume_texts: list, role_name: str, requirements: str) -> dict:
+    """One completion for all resumes; returns whatever verdicts could be parsed."""
+    candidates = "\n\n".join(
+        f"=== CANDIDATE {n} ===\n{text[:BATCH_RESUME_CHARS]}"
+        for n, text in enumerate(resume_texts, start=1)
+    )
+    prompt = f"""
+You are an ATS resume screening system.
+
+Evaluate each of the {len(resume_texts)} resumes below independently for the position: {role_name}
+
+Job Requirements:
+{requirements}
+
+Rules:
+- If the candidate meets the core job requirements → ELIGIBLE
+- Otherwise → NOT ELIGIBLE
+
+Respond with exactly one line per candidate and nothing else, in this format:
+1: ELIGIBLE
+2: NOT ELIGIBLE
+
+Resumes:
+{candidates}
+"""
+
+    try:
+        content = complete([
             {"role": "system", "content": f"You are a strict technical recruiter evaluating for a {role_name} role."},
             {"role": "user", "content": prompt}
-        ],
-        temperature=0
-    )
+        ], max_tokens=BATCH_TOKENS_PER_CANDIDATE * len(resume_texts) + BATCH_ANSWER_HEADROOM)
+        return parse_batch_verdicts(content, len(resume_texts))
+    except Exception as e:
+        print(f"Batched evaluation failed, falling back to single calls: {e}")
+        return {}
+
+
+def check_resumes_batch(resume_texts: list, role_name: str = "Software Engineer", requirements: str = "Programming skills AND CS/IT education") -> list:
+    """
+    Evaluate several resumes in one completion and return one decision per resume, in order.
+    Candidates missing from the batched answer are re-checked with check_resume; if that
+    call fails too, the exception is returned in the candidate's slot instead of raised,
+    so one bad resume doesn't fail the others.
+    """
+    verdicts = {}
+    if len(resume_texts) > 1:
+        verdicts = _evaluate_batch(resume_texts, role_name, requirements)
 
-    return response.choices[0].message.content.strip()
+    decisions = []
+    for i, text in enumerate(resume_texts):
+        if i in verdicts:
+            decisions.append(verdicts[i])
+            continue
+        try:
+            decisions.append(check_resume(text, role_name, requirements))
+        except Exception as e:
+            decisions.append(e)
+    return decisions
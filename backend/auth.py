@@ -1,12 +1,18 @@
+import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from database import get_db, User
+from database import SessionLocal, User
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,6 +21,11 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-this-in-prod")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24 hours
+# Token subject -> user lookups are cached this long (per process)
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+# pbkdf2 is slow on purpose; it gets its own threads so logins can't starve request handlers
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -25,6 +36,14 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+_hash_executor = ThreadPoolExecutor(PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+
+async def verify_password_async(plain_password, hashed_password):
+    return await asyncio.wrap_future(_hash_executor.submit(verify_password, plain_password, hashed_password))
+
+async def get_password_hash_async(password):
+    return await asyncio.wrap_future(_hash_executor.submit(get_password_hash, password))
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -35,7 +54,68 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+class UserCache:
+    """
+    Bounded LRU of token subject (email) -> user dict with a short TTL, so
+    polling endpoints don't hit the DB on every request. Entries are dropped
+    when the User row changes in this process; other processes rely on the TTL.
+    """
+
+    def __init__(self, ttl_seconds: int = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email: str):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self._entries[email]
+                return None
+            self._entries.move_to_end(email)
+            return user
+
+    def put(self, email: str, user: dict):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[email] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._entries.pop(email, None)
+
+
+user_cache = UserCache()
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate(target.email)
+    # An email change would otherwise leave the old address cached
+    for email in inspect(target).attrs.email.history.deleted or ():
+        user_cache.invalidate(email)
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+    Plain def on purpose: FastAPI runs it in the threadpool, so a cache miss
+    (one DB query) never blocks the event loop.
+    """
+    return get_user_from_token(token)
+
+def get_user_from_token(token: str, db: Session = None):
+    """
+    Validate a JWT and return the user it belongs to.
+    Used directly by endpoints that can't send an Authorization header (e.g. EventSource).
+    Opens its own session on a cache miss when no db is given.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -48,8 +128,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-        
-    user = db.query(User).filter(User.email == email).first()
+
+    cached = user_cache.get(email)
+    if cached is not None:
+        return cached
+
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        user = db.query(User.id, User.email).filter(User.email == email).first()
+    finally:
+        if own_session:
+            db.close()
     if user is None:
         raise credentials_exception
-    return {"id": user.id, "email": user.email}
+    found = {"id": user.id, "email": user.email}
+    user_cache.put(email, found)
+    return found
@@ -0,0 +1,126 @@
+"""
+Load test for authenticated polling: many clients hitting /results at once,
+with the previous async auth dependency (sync DB query on the event loop)
+and the current one (threadpool + user cache).
+
+    python bench_auth.py [--clients 10] [--seconds 10]
+
+Runs the app in-process against a throwaway SQLite DB. While the pollers run,
+a probe requests the unauthenticated health check; its latency shows how long
+the event loop was blocked. A few logins run alongside to include pbkdf2.
+
+Keep --clients below the connection pool size (15) for the "before" run: past
+that, the old dependency blocks the loop inside a pool checkout while the
+connections it waits for can only be released by the loop, and every request
+stalls for the 30 s pool timeout.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+os.environ["JOB_WORKER_IN_PROCESS"] = "0"
+os.environ["OUTBOX_IN_PROCESS"] = "0"
+
+import httpx
+from fastapi import Depends
+from fastapi.security import OAuth2PasswordBearer
+
+import auth
+import main
+from database import init_db, get_db, SessionLocal, ScreeningBatch, User
+from job_queue import enqueue_job
+
+
+async def _legacy_get_current_user(token: str = Depends(OAuth2PasswordBearer(tokenUrl="login")), db=Depends(get_db)):
+    """The dependency as it was: async, with a synchronous query on the event loop."""
+    auth.user_cache.invalidate(auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])["sub"])
+    return auth.get_user_from_token(token, db)
+
+
+def _percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+
+async def _run(client, token: str, job_id: int, clients: int, seconds: float):
+    headers = {"Authorization": f"Bearer {token}"}
+    deadline = time.perf_counter() + seconds
+    polls, probes, logins, errors = [], [], [], [0]
+
+    async def poller():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                r = await client.get("/results", params={"job_id": job_id}, headers=headers)
+                r.raise_for_status()
+            except Exception:
+                # e.g. the DB pool timing out while the blocked loop holds its connections
+                errors[0] += 1
+            polls.append(time.perf_counter() - start)
+
+    async def probe():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await client.get("/")
+            probes.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    async def login():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            r = await client.post("/login", params={"email": "bench@example.com", "password": "bench"})
+            r.raise_for_status()
+            logins.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[poller() for _ in range(clients)], probe(), login())
+    return polls, probes, logins, errors[0]
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password=auth.get_password_hash("bench"))
+    db.add(user)
+    db.flush()
+    batch = ScreeningBatch(user_id=user.id, company_name="bench", role_name="bench")
+    db.add(batch)
+    db.flush()
+    enqueue_job(db, batch.id, user.id, {"sheet_link": "bench"})
+    db.commit()
+    job_id = batch.id
+    db.close()
+    token = auth.create_access_token({"sub": "bench@example.com"})
+
+    print(f"{args.clients} pollers for {args.seconds:.0f}s each")
+    print(f"{'auth dependency':<18}{'polls/s':>9}{'poll p50':>10}{'poll p99':>10}{'loop p99':>10}{'login p99':>11}{'errors':>8}")
+    for name, override in (("async (before)", _legacy_get_current_user), ("threadpool+cache", None)):
+        main.app.dependency_overrides.clear()
+        if override:
+            main.app.dependency_overrides[auth.get_current_user] = override
+
+        async def go():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                return await _run(client, token, job_id, args.clients, args.seconds)
+
+        started = time.perf_counter()
+        polls, probes, logins, errors = asyncio.run(go())
+        # Requests still in flight at the deadline can stretch the run, rate over the real duration
+        elapsed = time.perf_counter() - started
+        print(f"{name:<18}{len(polls) / elapsed:>9.0f}{statistics.median(polls) * 1000:>8.1f}ms"
+              f"{_percentile(polls, 0.99):>8.1f}ms{_percentile(probes, 0.99):>8.1f}ms{_percentile(logins, 0.99):>9.1f}ms{errors:>8}")
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
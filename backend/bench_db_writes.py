@@ -0,0 +1,82 @@
+"""
+Compare ways of persisting screening results: one commit per candidate on a
+default SQLite file (the old behaviour) against WAL mode and batched commits.
+
+    python bench_db_writes.py [--candidates 10000] [--batch 50] [--url postgresql://...]
+
+Each candidate writes a CandidateResult and its OutboundEmail, like the persist stage.
+SQLite runs use a fresh file in a temp dir; --url benchmarks that database instead
+(its tables are created if missing, and the rows are left behind).
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, CandidateResult, OutboundEmail, ScreeningBatch, create_db_engine
+
+
+def _write(engine, candidates: int, batch: int):
+    """Returns (commits, seconds)."""
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    try:
+        screening_batch = ScreeningBatch(company_name="bench", role_name="bench")
+        db.add(screening_batch)
+        db.commit()
+
+        commits = 0
+        start = time.perf_counter()
+        for i in range(0, candidates, batch):
+            results = []
+            for n in range(i, min(i + batch, candidates)):
+                result = CandidateResult(batch_id=screening_batch.id, email=f"c{n}@example.com", status="ELIGIBLE", email_status="PENDING")
+                db.add(result)
+                results.append(result)
+            db.flush()
+            for result in results:
+                db.add(OutboundEmail(result_id=result.id, batch_id=result.batch_id, to_email=result.email, decision="NOT ELIGIBLE"))
+            db.commit()
+            commits += 1
+        return commits, time.perf_counter() - start
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=50, help="candidates per commit in batched runs")
+    parser.add_argument("--url", help="database URL to benchmark instead of temporary SQLite files")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def sqlite_url(name):
+            return f"sqlite:///{os.path.join(tmp, name)}.db"
+
+        if args.url:
+            runs = [
+                ("per-candidate", lambda: create_db_engine(args.url), 1),
+                (f"batch of {args.batch}", lambda: create_db_engine(args.url), args.batch),
+            ]
+        else:
+            runs = [
+                # The previous setup: default rollback journal, fsync on every commit
+                ("default, per-candidate", lambda: create_engine(sqlite_url("default")), 1),
+                ("WAL, per-candidate", lambda: create_db_engine(sqlite_url("wal")), 1),
+                (f"WAL, batch of {args.batch}", lambda: create_db_engine(sqlite_url("wal_batch")), args.batch),
+            ]
+
+        print(f"{'mode':<26}{'commits':>9}{'seconds':>10}{'commits/s':>11}{'candidates/s':>14}")
+        for name, make_engine, batch in runs:
+            commits, seconds = _write(make_engine(), args.candidates, batch)
+            print(f"{name:<26}{commits:>9}{seconds:>10.2f}{commits / seconds:>11.0f}{args.candidates / seconds:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Micro-benchmark of result-email construction.
+
+    python bench_email_templates.py [--messages 5000]
+
+Compares building every message from scratch (build_message) with compiling
+the batch templates once and filling in only the per-candidate fields.
+"""
+import argparse
+import time
+
+from calendar_invite import schedule_interview
+from email_sender import build_message
+from email_templates import BatchTemplates
+
+BRANDING = ("DUDE TECH", "Building smart hiring systems", "Software Engineer")
+
+
+def _decisions(count: int) -> list:
+    # Roughly one in three candidates shortlisted
+    return [
+        f"ELIGIBLE\nMeet: {schedule_interview()}" if i % 3 == 0 else "NOT ELIGIBLE"
+        for i in range(count)
+    ]
+
+
+def bench(label: str, build, decisions: list):
+    start = time.perf_counter()
+    for i, decision in enumerate(decisions):
+        build(f"candidate{i}@example.com", decision).as_bytes()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{len(decisions) / elapsed:>12.0f} msg/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+
+    decisions = _decisions(args.messages)
+    bench("per-message render", lambda to, d: build_message(to, d, *BRANDING), decisions)
+    templates = BatchTemplates(*BRANDING)
+    bench("compiled batch templates", templates.message, decisions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare PDF text extraction backends over a folder of sample resumes.
+
+    python bench_extract.py path/to/resumes [--max-chars 30000]
+
+Each backend runs in a fresh process so its peak RSS isn't polluted by the others.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+
+from resume_reader import PDF_EXTRACTORS, _read_pdf
+
+
+def _run_backend(name: str, paths: list, max_chars: int, out):
+    extractor = PDF_EXTRACTORS[name]
+    pages = 0
+    chars = 0
+    errors = 0
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            text, pages_read = _read_pdf(extractor, path, max_chars=max_chars)
+            chars += len(text)
+            pages += pages_read
+        except Exception:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    out.put((name, len(paths), pages, chars, errors, elapsed, peak_rss_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="folder containing .pdf resumes")
+    parser.add_argument("--max-chars", type=int, default=0, help="early-exit character budget (0 = read everything)")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.folder, f) for f in os.listdir(args.folder) if f.lower().endswith(".pdf")
+    )
+    if not paths:
+        raise SystemExit(f"No PDFs found in {args.folder}")
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'backend':<12}{'files':>7}{'pages':>8}{'pages/s':>10}{'chars':>11}{'errors':>8}{'peak RSS':>11}")
+    for name in PDF_EXTRACTORS:
+        out = ctx.Queue()
+        proc = ctx.Process(target=_run_backend, args=(name, paths, args.max_chars or None, out))
+        proc.start()
+        name, files, pages, chars, errors, elapsed, rss = out.get()
+        proc.join()
+        rate = pages / elapsed if elapsed else 0
+        print(f"{name:<12}{files:>7}{pages:>8}{rate:>10.1f}{chars:>11}{errors:>8}{rss:>8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
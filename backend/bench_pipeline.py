@@ -0,0 +1,162 @@
+"""
+End-to-end screening benchmark against local fakes (see fakes.py): sheet read,
+Drive download, parsing, the model and result emails, with no credentials.
+
+    python bench_pipeline.py [--sizes 100,1000,10000] [--groq-latency 0.2] [--groq-429 0.02]
+
+Each batch size runs in a fresh process with its own SQLite file, one queue
+worker and the outbox sender. Reports candidates/s until the last result email
+went out, p50/p99 seconds per stage (from the per-candidate stats recorded on
+the job; notify is per email), and the peak RSS of the worker process and of
+the largest parser process.
+
+Resumes are generated up front; batches larger than --files reuse the files
+round-robin under new applicant emails (force_reevaluate keeps the model in the
+loop). With --dedup those copies reuse the first copy's verdict instead, and
+--resubmit adds rows repeating an earlier email and file, which are collapsed.
+The model runs without the rate limiter unless --groq-rpm/--groq-tpm are set.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+STAGES = ("download", "extract", "parse", "dedup", "prescreen", "evaluate", "persist", "notify")
+
+
+def _run(size: int, args, out):
+    tmp = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["GROQ_RPM"] = str(args.groq_rpm)
+    os.environ["GROQ_TPM"] = str(args.groq_tpm)
+    os.environ["EVAL_BATCH_SIZE"] = str(args.eval_batch)
+    # Job logs and per-email prints would drown the table
+    sys.stdout = open(os.devnull, "w")
+
+    from fakes import Corpus, install_fakes, SHEET_LINK
+    from sqlalchemy import func
+    from database import init_db, SessionLocal, User, ScreeningBatch, OutboundEmail, CandidateResult
+    from job_queue import enqueue_job, job_stats
+    from jobs import get_job
+    from outbox import outbox_sender
+    from resume_reader import get_extractor_pool
+    from screening import SheetRequest
+    from worker import JobWorker
+
+    corpus = Corpus.generate(size, distinct_files=args.files, resubmit_share=args.resubmit, seed=args.seed)
+    fakes = install_fakes(
+        corpus, google_latency=args.google_latency, groq_latency=args.groq_latency,
+        groq_429_rate=args.groq_429, mail_latency=args.mail_latency
+    )
+
+    init_db()
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password="-")
+    db.add(user)
+    db.flush()
+    batch = ScreeningBatch(user_id=user.id, company_name="bench", role_name="Software Engineer")
+    db.add(batch)
+    db.flush()
+    req = SheetRequest(
+        sheet_link=SHEET_LINK, force_reevaluate=not args.dedup, eval_batch_size=args.eval_batch,
+        prescreen=args.prescreen, dedup=args.dedup,
+        role_requirements="Programming skills (Python, Java, C++, JavaScript, Go) AND Computer Science/IT degree"
+    )
+    enqueue_job(db, batch.id, user.id, req.model_dump(exclude={"smtp_config"}, exclude_none=True))
+    db.commit()
+
+    worker = JobWorker(poll_seconds=0.2)
+    outbox_sender.poll_seconds = 0.2
+    start = time.perf_counter()
+    worker.start()
+    outbox_sender.start()
+    job = get_job(batch.id, user.id)
+    while not job.finished:
+        time.sleep(0.2)
+    screened = time.perf_counter() - start
+    while db.query(OutboundEmail).filter(OutboundEmail.status.in_(("PENDING", "SENDING"))).count():
+        time.sleep(0.2)
+    elapsed = time.perf_counter() - start
+
+    worker.stop()
+    outbox_sender.stop()
+    stats = job_stats(db, batch.id)
+    # The fake model's verdict is the corpus label, so local decisions can be checked against it
+    eligible_by_email = {row[1]: corpus.files[row[2].split("id=")[1]]["eligible"] for row in corpus.rows}
+    local = db.query(CandidateResult.email, CandidateResult.status).filter(
+        CandidateResult.batch_id == batch.id, CandidateResult.decided_by == "prescreen"
+    ).all()
+    agreeing = sum(1 for email, status in local if (status == "ELIGIBLE") == eligible_by_email[email])
+    duplicates = dict(db.query(CandidateResult.dedup_kind, func.count(CandidateResult.id)).filter(
+        CandidateResult.batch_id == batch.id, CandidateResult.dedup_kind.isnot(None)
+    ).group_by(CandidateResult.dedup_kind).all())
+    db.close()
+    get_extractor_pool().shutdown()
+    # Reap the parser processes so RUSAGE_CHILDREN includes them
+    for child in multiprocessing.active_children():
+        child.join(10)
+    out.put({
+        "size": size,
+        "screened_seconds": screened,
+        "seconds": elapsed,
+        "stages": stats["stages"],
+        "tokens": stats["tokens"],
+        "emails": fakes.mail.sent,
+        "groq_calls": fakes.groq.calls,
+        "groq_429": fakes.groq.rate_limited,
+        "prescreened": len(local),
+        "prescreen_agreeing": agreeing,
+        "duplicates": duplicates,
+        # ru_maxrss is in KiB on Linux; children covers the parser processes joined above
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "parser_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated batch sizes")
+    parser.add_argument("--files", type=int, default=500, help="distinct resume files to generate")
+    parser.add_argument("--eval-batch", type=int, default=1, help="resumes per model request")
+    parser.add_argument("--google-latency", type=float, default=0.05, help="seconds per Sheets/Drive call")
+    parser.add_argument("--groq-latency", type=float, default=0.2, help="mean seconds per completion")
+    parser.add_argument("--groq-429", type=float, default=0.0, help="share of completions rejected with 429")
+    parser.add_argument("--groq-rpm", type=int, default=0)
+    parser.add_argument("--groq-tpm", type=int, default=0)
+    parser.add_argument("--mail-latency", type=float, default=0.01, help="seconds per send (per Gmail batch)")
+    parser.add_argument("--prescreen", action="store_true", help="score resumes locally first (PRESCREEN_* thresholds)")
+    parser.add_argument("--dedup", action="store_true", help="reuse verdicts of duplicate resumes (DEDUP_* settings)")
+    parser.add_argument("--resubmit", type=float, default=0.0, help="share of rows repeating an earlier email and file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    header = f"{'size':>6}{'cand/s':>8}{'seconds':>9}" + "".join(f"{s + ' p50/p99':>21}" for s in STAGES)
+    print(header + f"{'peak RSS':>11}{'parser RSS':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        out = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(size, args, out))
+        proc.start()
+        r = out.get()
+        proc.join()
+        cells = []
+        for stage in STAGES:
+            s = r["stages"].get(stage)
+            cells.append(f"{s['p50']:>10.3f}/{s['p99']:<10.3f}" if s else f"{'-':>21}")
+        print(f"{r['size']:>6}{r['size'] / r['seconds']:>8.1f}{r['seconds']:>9.1f}" + "".join(cells)
+              + f"{r['peak_rss_mb']:>8.1f} MB{r['parser_rss_mb']:>9.1f} MB")
+        print(f"{'':>6}screened in {r['screened_seconds']:.1f}s, {r['emails']} emails, "
+              f"{r['groq_calls']} model calls ({r['groq_429']} got 429), {r['tokens']} tokens")
+        if args.prescreen:
+            print(f"{'':>6}pre-screen decided {r['prescreened']} locally, "
+                  f"{r['prescreen_agreeing']} agreeing with the model's verdict")
+        if args.dedup:
+            print(f"{'':>6}dedup collapsed {r['duplicates'].get('submission', 0)} repeated submissions, "
+                  f"reused {r['duplicates'].get('resume', 0)} verdicts of duplicate resumes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,51 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, Float, String, Text, DateTime, Boolean, LargeBinary, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import datetime
+import os
 
-# SQLite database file path
-DATABASE_URL = "sqlite:///./screening.db"
+# ---------- CONFIG ----------
+# SQLite file by default; set to a postgresql:// URL to use Postgres
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./screening.db")
+# Connection pool for server databases (SQLite ignores these)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+# WAL lets readers run while a writer commits; NORMAL skips the fsync on every commit
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def create_db_engine(url: str = DATABASE_URL):
+    # Some hosts still hand out the old postgres:// scheme
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=True,
+        )
+
+    sqlite_engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000})
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache per connection
+        cursor.close()
+
+    return sqlite_engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -23,12 +62,18 @@ class ScreeningBatch(Base):
     __tablename__ = "screening_batches"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     company_name = Column(String)
     tagline = Column(String)
     role_name = Column(String)
     role_requirements = Column(Text)
+    # Optional custom email templates (see email_templates.py for placeholders)
+    eligible_template = Column(Text)
+    rejected_template = Column(Text)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    # Custom SMTP settings live only in the memory of the API process that received them
+    smtp_owner = Column(String) # outbox sender id of that process
+    smtp_heartbeat_at = Column(DateTime) # renewed while that process still holds the settings
     
     # Relationship to results
     results = relationship("CandidateResult", back_populates="batch")
@@ -36,17 +81,177 @@ class ScreeningBatch(Base):
 
 class CandidateResult(Base):
     __tablename__ = "candidate_results"
+    # Covers the per-batch status counts in /history without touching the table
+    __table_args__ = (Index("ix_candidate_results_batch_id_status", "batch_id", "status"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    batch_id = Column(Integer, ForeignKey("screening_batches.id"))
+    batch_id = Column(Integer, ForeignKey("screening_batches.id"), index=True)
     email = Column(String)
     status = Column(String) # ELIGIBLE or NOT ELIGIBLE
+    email_status = Column(String, default="PENDING") # PENDING, SENT or FAILED
+    decided_by = Column(String) # model, prescreen or dedup
+    prescreen_score = Column(Float) # local keyword score, when the job used the pre-screen
+    duplicate_of = Column(Integer, ForeignKey("candidate_results.id")) # earlier result this one copies
+    dedup_kind = Column(String) # submission (same email and file, not emailed) or resume (near-duplicate text)
+    dedup_similarity = Column(Float) # estimated text similarity to duplicate_of, for resume duplicates
     
     batch = relationship("ScreeningBatch", back_populates="results")
 
+class OutboundEmail(Base):
+    """Result email waiting to be sent (or already sent) for one CandidateResult."""
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    result_id = Column(Integer, ForeignKey("candidate_results.id"), index=True)
+    batch_id = Column(Integer, ForeignKey("screening_batches.id"))
+    to_email = Column(String)
+    decision = Column(String) # "ELIGIBLE\nMeet: <link>" or "NOT ELIGIBLE"
+    use_own_smtp = Column(Boolean, default=False)
+    status = Column(String, default="PENDING", index=True) # PENDING, SENDING, SENT or FAILED
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    last_error = Column(Text)
+    send_seconds = Column(Float) # last send attempt, a share of its group's call time
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class ScreeningJob(Base):
+    """
+    Queued screening run for one batch. A worker expands it into WorkItems by
+    reading the sheet (rows_read tracks how far it got), then items are leased
+    out to workers until none are left.
+    """
+    __tablename__ = "screening_jobs"
+
+    id = Column(Integer, ForeignKey("screening_batches.id"), primary_key=True) # same id as the batch
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    request = Column(Text) # SheetRequest as JSON, without SMTP credentials
+    status = Column(String, default="QUEUED", index=True) # QUEUED, RUNNING, FINISHING, DONE or FAILED
+    start_row = Column(Integer, default=0) # data rows skipped by an incremental run
+    rows_read = Column(Integer, default=0) # last sheet data row turned into a work item
+    total_rows = Column(Integer, default=0) # estimate until the sheet is fully read
+    expanded = Column(Boolean, default=False)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime)
+    stats = Column(Text) # JSON stage timing summary, saved when the job finishes
+
+class WorkItem(Base):
+    """One candidate row of a ScreeningJob, leased to a worker while it is screened."""
+    __tablename__ = "work_items"
+    __table_args__ = (UniqueConstraint("job_id", "row"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("screening_jobs.id"), index=True)
+    row = Column(Integer)
+    email = Column(String)
+    resume_link = Column(String)
+    status = Column(String, default="PENDING", index=True) # PENDING, LEASED, DONE or FAILED
+    result = Column(String) # ELIGIBLE, NOT ELIGIBLE, SKIPPED, ERROR or PARSE_ERROR
+    attempts = Column(Integer, default=0)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    error = Column(Text)
+    stats = Column(Text) # JSON: seconds per stage, downloaded bytes and model tokens
+    duplicate_of_row = Column(Integer) # earlier row of the job with the same email and resume file
+    permanent = Column(Boolean) # failed for good (dead link, unreadable file): incremental runs move past it
+    result_id = Column(Integer, ForeignKey("candidate_results.id"))
+
+class JobEvent(Base):
+    """Log line or result of a job, readable from any API process. The id is the stream cursor."""
+    __tablename__ = "job_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("screening_jobs.id"), index=True)
+    kind = Column(String) # log or result
+    data = Column(Text)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class SheetSyncState(Base):
+    """High-water mark of a user's response sheet: data rows already handled."""
+    __tablename__ = "sheet_sync_state"
+    __table_args__ = (UniqueConstraint("user_id", "sheet_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    sheet_id = Column(String)
+    rows_processed = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class ScreenedSubmission(Base):
+    """Dedup index: a candidate email + resume file revision already screened from a sheet."""
+    __tablename__ = "screened_submissions"
+    __table_args__ = (UniqueConstraint("user_id", "sheet_id", "email", "file_id", "revision"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    sheet_id = Column(String)
+    email = Column(String)
+    file_id = Column(String)
+    revision = Column(String)
+    row = Column(Integer) # sheet data row it was screened from
+    result_id = Column(Integer, ForeignKey("candidate_results.id"))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ResumeText(Base):
+    """Extracted resume text, keyed by Drive file id + revision (md5Checksum or modifiedTime)."""
+    __tablename__ = "resume_text_cache"
+    __table_args__ = (UniqueConstraint("file_id", "revision"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(String, index=True)
+    revision = Column(String)
+    text = Column(Text)
+    size = Column(Integer)
+    last_used = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class Verdict(Base):
+    """Memoized LLM decision for a (resume text, role, requirements, model) hash."""
+    __tablename__ = "verdict_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True)
+    decision = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class ResumeFingerprint(Base):
+    """MinHash signature of a screened resume and the model's verdict, for near-duplicate lookups (see dedup.py)."""
+    __tablename__ = "resume_fingerprints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    result_id = Column(Integer, ForeignKey("candidate_results.id"))
+    status = Column(String) # ELIGIBLE or NOT ELIGIBLE
+    signature = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class ResumeLshBand(Base):
+    """LSH bucket of one band of a fingerprint; the key also covers the user and screening criteria."""
+    __tablename__ = "resume_lsh_bands"
+
+    id = Column(Integer, primary_key=True, index=True)
+    fingerprint_id = Column(Integer, ForeignKey("resume_fingerprints.id"), index=True)
+    key = Column(String, index=True)
+
 # Create tables
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+def _add_missing_columns():
+    """
+    create_all() doesn't alter existing tables, so add columns and indexes
+    introduced after a database was first created. Existing rows get NULL.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,176 @@
+"""
+Near-duplicate resumes. Each parsed resume gets a MinHash signature of its word
+shingles. Signatures of screened resumes are kept in the DB with the model's
+verdict, together with an LSH index: the signature is cut into bands and each
+band hashed into a bucket key, so a lookup only compares against resumes that
+share a bucket. A resume whose estimated similarity to an earlier one reaches
+DEDUP_SIMILARITY reuses that verdict instead of calling the model.
+
+Lookups are scoped to the user and the screening criteria (role, requirements
+and model), since a verdict only holds for the criteria it was given under.
+Only committed results are found, so two copies screened at the same moment
+are both evaluated.
+
+Repeated submissions of the same file by the same email are collapsed earlier,
+when the sheet is read (see ScreeningRun.read_sheet).
+"""
+import datetime
+import hashlib
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from database import SessionLocal, ResumeFingerprint, ResumeLshBand
+
+# ---------- CONFIG ----------
+# Default for SheetRequest.dedup. Off: a reused verdict is a guess, see .env.example
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "0") == "1"
+# Estimated share of common word shingles from which a resume counts as a copy of an earlier one
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.9"))
+DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", str(90 * 24 * 3600)))
+# Resumes looked up per query (pipeline batch), and how long to wait to fill one
+DEDUP_BATCH_SIZE = int(os.getenv("DEDUP_BATCH_SIZE", "32"))
+DEDUP_BATCH_WAIT_SECONDS = float(os.getenv("DEDUP_BATCH_WAIT_SECONDS", "0.5"))
+
+# Changing these makes stored signatures unusable
+NUM_PERM = 128
+# 16 bands of 8 rows: resumes 0.9 similar share a bucket 99.9% of the time, 0.8 similar 95%
+LSH_BANDS = 16
+SHINGLE_WORDS = 3
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(1103)
+_A = _rng.randint(1, _PRIME, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, NUM_PERM).astype(np.uint64)
+_WORD = re.compile(r"\w+")
+# Bucket keys per IN (...) query, below SQLite's bound parameter limit
+_KEYS_PER_QUERY = 500
+
+
+def minhash(text: str):
+    """MinHash signature (NUM_PERM uint32) of the text's word shingles, or None if it has no words."""
+    words = _WORD.findall((text or "").lower())
+    if not words:
+        return None
+    k = min(SHINGLE_WORDS, len(words))
+    shingles = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # One universal hash per permutation: (a * x + b) mod p stays below 2**62
+    return ((np.outer(_A, hashes % _PRIME) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def criteria_scope(user_id: int, role_name: str, requirements: str, model: str) -> str:
+    payload = "\x1f".join([str(user_id), model, role_name.strip(), requirements.strip()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def band_keys(scope: str, signature) -> list:
+    rows = NUM_PERM // LSH_BANDS
+    return [
+        hashlib.blake2b(f"{scope}:{band}:".encode() + signature[band * rows:(band + 1) * rows].tobytes(), digest_size=16).hexdigest()
+        for band in range(LSH_BANDS)
+    ]
+
+
+class DuplicateIndex:
+    """
+    Near-duplicate lookups for one job's criteria. One instance per job so the
+    number of reused verdicts can be reported in the job log.
+    """
+
+    def __init__(self, scope: str, threshold: float = DEDUP_SIMILARITY, ttl_seconds: int = DEDUP_TTL_SECONDS):
+        self.scope = scope
+        self.threshold = threshold
+        self.ttl = datetime.timedelta(seconds=ttl_seconds)
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def find(self, signatures: list) -> list:
+        """
+        For each signature (or None), the most similar earlier resume at or above
+        the threshold as (result_id, status, similarity), else None.
+        """
+        wanted = {}
+        for i, signature in enumerate(signatures):
+            if signature is not None:
+                for key in band_keys(self.scope, signature):
+                    wanted.setdefault(key, []).append(i)
+        matches = [None] * len(signatures)
+        if not wanted:
+            return matches
+
+        keys = list(wanted)
+        cutoff = datetime.datetime.utcnow() - self.ttl
+        db = SessionLocal()
+        try:
+            rows = []
+            for start in range(0, len(keys), _KEYS_PER_QUERY):
+                rows += db.query(
+                    ResumeLshBand.key, ResumeFingerprint.id, ResumeFingerprint.result_id,
+                    ResumeFingerprint.status, ResumeFingerprint.signature
+                ).join(ResumeFingerprint, ResumeFingerprint.id == ResumeLshBand.fingerprint_id).filter(
+                    ResumeLshBand.key.in_(keys[start:start + _KEYS_PER_QUERY]),
+                    ResumeFingerprint.created_at >= cutoff
+                ).all()
+        finally:
+            db.close()
+
+        compared = set()
+        for key, fingerprint_id, result_id, status, stored in rows:
+            for i in wanted[key]:
+                if (i, fingerprint_id) in compared:
+                    continue
+                compared.add((i, fingerprint_id))
+                score = similarity(signatures[i], np.frombuffer(stored, dtype=np.uint32))
+                best = matches[i]
+                # Ties go to the earliest result
+                if score >= self.threshold and (best is None or (score, -result_id) > (best[2], -best[0])):
+                    matches[i] = (result_id, status, round(score, 4))
+
+        with self._lock:
+            self.hits += sum(1 for m in matches if m is not None)
+        return matches
+
+    def add(self, db, entries: list):
+        """Index (result_id, status, signature) entries in the caller's transaction (the caller commits)."""
+        if not entries:
+            return
+        fingerprints = [
+            ResumeFingerprint(result_id=result_id, status=status, signature=signature.tobytes())
+            for result_id, status, signature in entries
+        ]
+        db.add_all(fingerprints)
+        db.flush()
+        db.bulk_insert_mappings(ResumeLshBand, [
+            {"fingerprint_id": fingerprint.id, "key": key}
+            for fingerprint, (_, _, signature) in zip(fingerprints, entries)
+            for key in band_keys(self.scope, signature)
+        ])
+
+    def evict(self):
+        """Drop fingerprints past the TTL. Called once per job."""
+        db = SessionLocal()
+        try:
+            expired = db.query(ResumeFingerprint.id).filter(
+                ResumeFingerprint.created_at < datetime.datetime.utcnow() - self.ttl
+            )
+            db.query(ResumeLshBand).filter(
+                ResumeLshBand.fingerprint_id.in_(expired.scalar_subquery())
+            ).delete(synchronize_session=False)
+            db.query(ResumeFingerprint).filter(
+                ResumeFingerprint.id.in_(expired.scalar_subquery())
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def summary(self) -> str:
+        return f"Near-duplicate resumes: {self.hits} reused an earlier verdict"
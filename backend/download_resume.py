@@ -1,13 +1,8 @@
-from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 import io
 
-# ✅ Use shared Google auth (env-based, no local files)
-from google_auth import get_credentials, SCOPES_SHEETS_DRIVE
-
-# -------- AUTH --------
-creds = get_credentials(SCOPES_SHEETS_DRIVE)
-drive_service = build("drive", "v3", credentials=creds)
+# ✅ Use shared Google auth (env-based, no local files), built lazily on first use
+from google_auth import get_service
 
 # -------- FUNCTIONS --------
 def extract_file_id(link: str):
@@ -26,7 +21,7 @@ def download_file(file_id: str, output_filename: str):
     """
     Download file from Google Drive using file ID
     """
-    request = drive_service.files().get_media(fileId=file_id)
+    request = get_service("drive", "v3").files().get_media(fileId=file_id)
     fh = io.FileIO(output_filename, "wb")
     downloader = MediaIoBaseDownload(fh, request)
 
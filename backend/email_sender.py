@@ -1,114 +1,198 @@
 import os
 import base64
+import queue
 import smtplib
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+import time
 from dotenv import load_dotenv
-from gmail_client import get_gmail_service
+from services import gmail_service, smtp_connection
+from email_templates import BatchTemplates
+from metrics import track_call
 
 load_dotenv()
 
+def build_message(to_email: str, decision: str, company_name: str = "DUDE TECH", tagline: str = "Building smart hiring systems", role_name: str = "Software Engineer"):
+    """
+    Builds the branded result email for one candidate (From is set by the sender).
+    When sending many, compile a BatchTemplates once and call .message() instead.
+    """
+    return BatchTemplates(company_name, tagline, role_name).message(to_email, decision)
+
+
 def send_email(to_email: str, decision: str, company_name: str = "DUDE TECH", tagline: str = "Building smart hiring systems", role_name: str = "Software Engineer", use_own_smtp: bool = False, smtp_config: dict = None):
     """
     Sends email using either Gmail API or a custom SMTP server.
+    For many recipients use a Notifier, which reuses connections.
     """
-    
-    # Decisions markers
-    is_eligible = decision.startswith("ELIGIBLE")
-    
-    # Subject Line
-    if is_eligible:
-        subject = f"🎉 Interview Invitation – {role_name} | {company_name}"
-    else:
-        subject = f"Application Update – {role_name} | {company_name}"
-
-    # Email Branding
-    BRAND_GRADIENT = "linear-gradient(135deg,#667eea,#764ba2)"
-    HEADER_BG = BRAND_GRADIENT if is_eligible else "#111827"
-
-    # HTML Body
-    if is_eligible:
-        meet_link = decision.split("Meet:")[-1].strip() if "Meet:" in decision else "#"
-        body_content = f"""
-              <p>Hello,</p>
-              <p>Thank you for applying for the <strong>{role_name}</strong> position at <strong>{company_name}</strong>.</p>
-              <p>After reviewing your resume, we are happy to inform you that your profile has been <strong>shortlisted</strong>.</p>
-              <div style="background:#eef2ff;padding:16px;border-radius:10px;margin:20px 0;">
-                <p style="margin:0;"><strong>📅 Interview Details</strong></p>
-                <p style="margin:8px 0;">Mode: Google Meet</p>
-                <p style="margin:8px 0;">Meeting Link:<br/><a href="{meet_link}" style="color:#4f46e5;">{meet_link}</a></p>
-              </div>
-        """
-    else:
-        body_content = f"""
-              <p>Hello,</p>
-              <p>Thank you for your interest in the <strong>{role_name}</strong> position at <strong>{company_name}</strong>.</p>
-              <p>After careful review, we will not be moving forward with your application at this time.</p>
-        """
+    msg = build_message(to_email, decision, company_name, tagline, role_name)
+    with Notifier(company_name, use_own_smtp, smtp_config, pool_size=1) as notifier:
+        notifier.send(to_email, msg)
+
+
+# ---------- BATCH NOTIFIER ----------
+# Idle SMTP connections older than this are checked with NOOP before reuse
+SMTP_IDLE_CHECK_SECONDS = int(os.getenv("SMTP_IDLE_CHECK_SECONDS", "30"))
+# Gmail batch requests accept up to 100 calls; Google recommends staying well below
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "20"))
+
 
-    html_body = f"""
-    <html>
-    <body style="margin:0;background:#f4f6fc;font-family:Arial,sans-serif;">
-      <div style="max-width:600px;margin:30px auto;background:#ffffff;
-                  border-radius:14px;overflow:hidden;
-                  box-shadow:0 15px 40px rgba(0,0,0,0.2)">
-        <div style="background:{HEADER_BG};padding:26px;color:white;">
-          <h2 style="margin:0;">{company_name}</h2>
-          <p style="margin:6px 0 0;font-size:14px;">{tagline}</p>
-        </div>
-        <div style="padding:26px;color:#1a202c;">
-          {body_content}
-          <p style="margin-top:28px;">Best regards,<br/><strong>Hiring Team</strong><br/>{company_name}</p>
-        </div>
-        <div style="background:#f8fafc;padding:14px;text-align:center;font-size:12px;color:#6b7280;">
-          © {company_name} · AI-powered recruitment platform
-        </div>
-      </div>
-    </body>
-    </html>
+class SmtpPool:
     """
+    Pool of logged-in SMTP connections for one batch. Connections are reused
+    across messages and replaced when the server has dropped them.
+    """
+
+    def __init__(self, smtp_config: dict, size: int = 4):
+        self.host = smtp_config.get("host")
+        self.port = int(smtp_config.get("port", 465))
+        self.user = smtp_config.get("user")
+        self.password = smtp_config.get("password")
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
 
-    # Create message
-    msg = MIMEMultipart("alternative")
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(html_body, "html"))
-
-    if use_own_smtp and smtp_config:
-        # Use Custom SMTP
-        host = smtp_config.get("host")
-        port = int(smtp_config.get("port", 465))
-        user = smtp_config.get("user")
-        password = smtp_config.get("password")
-        
-        msg['From'] = user
+    def _connect(self):
+        return smtp_connection(self.host, self.port, self.user, self.password)
+
+    def _is_alive(self, server) -> bool:
         try:
-            context = ssl.create_default_context()
-            
-            # Port 465 is typically for implicit SSL
-            if port == 465:
-                with smtplib.SMTP_SSL(host, port, context=context) as server:
-                    server.login(user, password)
-                    server.sendmail(user, to_email, msg.as_string())
-            else:
-                # Ports like 25, 587 are for STARTTLS
-                with smtplib.SMTP(host, port) as server:
-                    server.starttls(context=context)
-                    server.login(user, password)
-                    server.sendmail(user, to_email, msg.as_string())
-            print(f"Email sent via SMTP ({host}:{port})")
-        except Exception as e:
-            print(f"SMTP Error ({host}:{port}): {e}")
-            raise e
-    else:
-        # Fallback to Gmail API
-        msg['From'] = f"{company_name} <me>"
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _acquire(self):
+        self._slots.acquire()
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._slots.release()
+                    raise
+            if time.monotonic() - last_used < SMTP_IDLE_CHECK_SECONDS or self._is_alive(server):
+                return server
+            self._close(server)
+
+    def _release(self, server, healthy: bool):
+        if healthy:
+            self._idle.put((server, time.monotonic()))
+        else:
+            self._close(server)
+        self._slots.release()
+
+    def _close(self, server):
         try:
-            service = get_gmail_service()
-            raw_string = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-            message = service.users().messages().send(userId="me", body={'raw': raw_string}).execute()
-            print(f"Email sent via Gmail API! Message Id: {message['id']}")
-        except Exception as e:
-            print(f"Gmail API Error: {e}")
-            raise e
+            server.quit()
+        except Exception:
+            pass
+
+    def send(self, to_email: str, msg):
+        msg['From'] = self.user
+        for attempt in range(2):
+            server = self._acquire()
+            try:
+                server.sendmail(self.user, to_email, msg.as_string())
+            except smtplib.SMTPServerDisconnected:
+                # Connection went stale between the check and the send, retry once on a fresh one
+                self._release(server, healthy=False)
+                if attempt == 1:
+                    raise
+                continue
+            except Exception:
+                self._release(server, healthy=False)
+                raise
+            self._release(server, healthy=True)
+            return
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+
+class Notifier:
+    """
+    Sends result emails for one screening batch.
+    Custom SMTP goes through a pool of reused connections; the Gmail API path
+    reuses one service per thread (httplib2 is not thread-safe) and sends
+    several messages per HTTP round trip with the batch API.
+    """
+
+    def __init__(self, company_name: str, use_own_smtp: bool = False, smtp_config: dict = None, pool_size: int = 4):
+        self.company_name = company_name
+        self.smtp = SmtpPool(smtp_config, pool_size) if use_own_smtp and smtp_config else None
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _gmail(self):
+        if not hasattr(self._local, "service"):
+            self._local.service = gmail_service()
+        return self._local.service
+
+    def _gmail_raw(self, msg) -> dict:
+        msg['From'] = f"{self.company_name} <me>"
+        return {'raw': base64.urlsafe_b64encode(msg.as_bytes()).decode()}
+
+    def send(self, to_email: str, msg):
+        if self.smtp:
+            try:
+                with track_call("smtp", "send"):
+                    self.smtp.send(to_email, msg)
+                print(f"Email sent via SMTP ({self.smtp.host}:{self.smtp.port})")
+            except Exception as e:
+                print(f"SMTP Error ({self.smtp.host}:{self.smtp.port}): {e}")
+                raise e
+        else:
+            try:
+                with track_call("gmail", "messages.send"):
+                    message = self._gmail().users().messages().send(userId="me", body=self._gmail_raw(msg)).execute()
+                print(f"Email sent via Gmail API! Message Id: {message['id']}")
+            except Exception as e:
+                print(f"Gmail API Error: {e}")
+                raise e
+
+    def send_many(self, messages: list) -> list:
+        """
+        Send [(to_email, msg), ...] and return one entry per message:
+        None when delivered, or the exception that message failed with.
+        """
+        results = [None] * len(messages)
+        if self.smtp or len(messages) == 1:
+            for i, (to_email, msg) in enumerate(messages):
+                try:
+                    self.send(to_email, msg)
+                except Exception as e:
+                    results[i] = e
+            return results
+
+        service = self._gmail()
+        for start in range(0, len(messages), GMAIL_BATCH_SIZE):
+            def callback(request_id, response, exception):
+                results[int(request_id)] = exception
+
+            batch = service.new_batch_http_request(callback=callback)
+            for i in range(start, min(start + GMAIL_BATCH_SIZE, len(messages))):
+                batch.add(service.users().messages().send(userId="me", body=self._gmail_raw(messages[i][1])), request_id=str(i))
+            try:
+                with track_call("gmail", "batch"):
+                    batch.execute()
+            except Exception as e:
+                for i in range(start, min(start + GMAIL_BATCH_SIZE, len(messages))):
+                    results[i] = e
+        sent = sum(1 for r in results if r is None)
+        print(f"Email batch sent via Gmail API: {sent}/{len(messages)} delivered")
+        return results
+
+    def close(self):
+        if self.smtp:
+            self.smtp.close()
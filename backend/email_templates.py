@@ -0,0 +1,105 @@
+import html
+from string import Template
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+# Placeholders available to templates (string.Template syntax):
+#   $company_name  $tagline  $role_name   - same for the whole batch
+#   $meet_link                            - per candidate (eligible emails only)
+
+ELIGIBLE_SUBJECT = "🎉 Interview Invitation – $role_name | $company_name"
+REJECTED_SUBJECT = "Application Update – $role_name | $company_name"
+
+# Email Branding
+BRAND_GRADIENT = "linear-gradient(135deg,#667eea,#764ba2)"
+
+_LAYOUT = """
+    <html>
+    <body style="margin:0;background:#f4f6fc;font-family:Arial,sans-serif;">
+      <div style="max-width:600px;margin:30px auto;background:#ffffff;
+                  border-radius:14px;overflow:hidden;
+                  box-shadow:0 15px 40px rgba(0,0,0,0.2)">
+        <div style="background:{header_bg};padding:26px;color:white;">
+          <h2 style="margin:0;">$company_name</h2>
+          <p style="margin:6px 0 0;font-size:14px;">$tagline</p>
+        </div>
+        <div style="padding:26px;color:#1a202c;">
+          {body_content}
+          <p style="margin-top:28px;">Best regards,<br/><strong>Hiring Team</strong><br/>$company_name</p>
+        </div>
+        <div style="background:#f8fafc;padding:14px;text-align:center;font-size:12px;color:#6b7280;">
+          © $company_name · AI-powered recruitment platform
+        </div>
+      </div>
+    </body>
+    </html>
+    """
+
+ELIGIBLE_TEMPLATE = _LAYOUT.format(header_bg=BRAND_GRADIENT, body_content="""
+              <p>Hello,</p>
+              <p>Thank you for applying for the <strong>$role_name</strong> position at <strong>$company_name</strong>.</p>
+              <p>After reviewing your resume, we are happy to inform you that your profile has been <strong>shortlisted</strong>.</p>
+              <div style="background:#eef2ff;padding:16px;border-radius:10px;margin:20px 0;">
+                <p style="margin:0;"><strong>📅 Interview Details</strong></p>
+                <p style="margin:8px 0;">Mode: Google Meet</p>
+                <p style="margin:8px 0;">Meeting Link:<br/><a href="$meet_link" style="color:#4f46e5;">$meet_link</a></p>
+              </div>
+        """)
+
+REJECTED_TEMPLATE = _LAYOUT.format(header_bg="#111827", body_content="""
+              <p>Hello,</p>
+              <p>Thank you for your interest in the <strong>$role_name</strong> position at <strong>$company_name</strong>.</p>
+              <p>After careful review, we will not be moving forward with your application at this time.</p>
+        """)
+
+# Stands in for $meet_link after the batch-level pass, then the body is split on it
+_MEET_SLOT = "\x00meet_link\x00"
+
+
+class CompiledTemplate:
+    """
+    A template with the batch-invariant fields already filled in and HTML-escaped.
+    Rendering a message only joins the pre-rendered pieces around the meet link.
+    """
+
+    def __init__(self, subject: str, body: str, fields: dict):
+        escaped = {k: html.escape(v or "") for k, v in fields.items()}
+        self.subject = Template(subject).safe_substitute(fields, meet_link="")
+        self._parts = Template(body).safe_substitute(escaped, meet_link=_MEET_SLOT).split(_MEET_SLOT)
+        # Bodies without per-candidate fields are encoded once and shared by every message
+        self._static_part = MIMEText(self._parts[0], "html") if len(self._parts) == 1 else None
+
+    def render(self, meet_link: str = "") -> str:
+        return html.escape(meet_link or "#").join(self._parts)
+
+    def body_part(self, meet_link: str = ""):
+        return self._static_part or MIMEText(self.render(meet_link), "html")
+
+
+class BatchTemplates:
+    """
+    Eligible and rejection templates for one screening batch, compiled once.
+    Custom templates (HTML with $placeholders) replace the built-in ones.
+    """
+
+    def __init__(self, company_name: str, tagline: str, role_name: str,
+                 eligible_template: str = None, rejected_template: str = None):
+        fields = {"company_name": company_name, "tagline": tagline, "role_name": role_name}
+        self.company_name = company_name
+        self.eligible = CompiledTemplate(ELIGIBLE_SUBJECT, eligible_template or ELIGIBLE_TEMPLATE, fields)
+        self.rejected = CompiledTemplate(REJECTED_SUBJECT, rejected_template or REJECTED_TEMPLATE, fields)
+
+    def message(self, to_email: str, decision: str):
+        """Build the MIME message for one candidate (From is set by the sender)."""
+        if decision.startswith("ELIGIBLE"):
+            template = self.eligible
+            meet_link = decision.split("Meet:")[-1].strip() if "Meet:" in decision else "#"
+        else:
+            template = self.rejected
+            meet_link = ""
+
+        msg = MIMEMultipart("alternative")
+        msg['To'] = to_email
+        msg['Subject'] = template.subject
+        msg.attach(template.body_part(meet_link))
+        return msg
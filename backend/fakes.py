@@ -0,0 +1,431 @@
+"""
+Local stand-ins for the external services, for benchmarks and offline runs:
+
+- Corpus: generated PDF and DOCX resumes plus the response sheet listing them
+- FakeGoogle: in-memory Sheets and Drive serving a Corpus
+- FakeGroq: chat completions with configurable latency and 429 rate
+- MailSink: Gmail API and SMTP stand-ins that keep count of what was sent
+
+    from fakes import Corpus, install_fakes
+    corpus = Corpus.generate(1000)
+    install_fakes(corpus, groq_latency=0.2, groq_429_rate=0.05)
+
+Nothing here talks to the network. The fakes answer the same calls the app
+makes (see sheet_reader.py, screening.py, ai_evaluator.py, email_sender.py),
+not the whole Google or Groq API.
+"""
+import hashlib
+import io
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import httplib2
+import httpx
+from groq import RateLimitError
+
+import services
+from resume_reader import DOCX_MIME
+
+PDF_MIME = "application/pdf"
+SHEET_ID = "FAKE_SHEET"
+SHEET_LINK = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/edit"
+HEADER = ["Timestamp", "Email Address", "Upload Resume"]
+
+
+# ---------- RESUME CORPUS ----------
+_FIRST = ["Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Sara", "Kabir", "Meera", "Arjun", "Isha", "Dev", "Nisha"]
+_LAST = ["Sharma", "Iyer", "Khan", "Patel", "Reddy", "Das", "Mehta", "Nair", "Gupta", "Singh", "Bose", "Rao"]
+_CS_DEGREES = ["B.Tech in Computer Science", "B.E. Information Technology", "M.Sc Computer Science", "BCA (Computer Applications)"]
+_OTHER_DEGREES = ["BBA in Marketing", "B.Sc Biology", "B.Com Accounting", "BA English Literature", "B.Des Fashion Design"]
+_LANGUAGES = ["Python", "Java", "C++", "JavaScript", "Go", "TypeScript", "SQL", "Rust"]
+_TOOLS = ["Git", "Docker", "Linux", "AWS", "React", "Django", "Kubernetes", "PostgreSQL"]
+_OTHER_SKILLS = ["Sales", "Market research", "Excel", "Public speaking", "Event planning", "Lab techniques", "Copywriting", "Tally"]
+_CS_DUTIES = [
+    "Built REST APIs serving {n}k requests per day",
+    "Wrote unit and integration tests, raising coverage to {n}%",
+    "Migrated a monolith service to containers on Kubernetes",
+    "Optimised SQL queries, cutting report time by {n}%",
+    "Implemented a caching layer that reduced latency by {n} ms",
+]
+_OTHER_DUTIES = [
+    "Managed a marketing budget of {n} lakh across regions",
+    "Coordinated {n} campus events with external sponsors",
+    "Prepared monthly financial statements for {n} clients",
+    "Ran field surveys with {n} participants",
+    "Wrote product copy for {n} seasonal campaigns",
+]
+# Profile kinds: CS graduates who code, self-taught coders, CS graduates without
+# programming experience and unrelated backgrounds. Only the first is eligible.
+PROFILE_WEIGHTS = {"engineer": 45, "self_taught": 15, "cs_no_code": 10, "unrelated": 30}
+
+
+def qualifies(text: str) -> bool:
+    """The rule FakeGroq applies: a CS/IT degree and at least two programming languages."""
+    lowered = text.lower()
+    degree = any(d.lower() in lowered for d in _CS_DEGREES)
+    languages = sum(1 for lang in _LANGUAGES if re.search(rf"(?<![\w+]){re.escape(lang.lower())}(?![\w+])", lowered))
+    return degree and languages >= 2
+
+
+def resume_lines(rng: random.Random, kind: str, name: str, email: str) -> list:
+    degree = rng.choice(_CS_DEGREES if kind in ("engineer", "cs_no_code") else _OTHER_DEGREES)
+    if kind in ("engineer", "self_taught"):
+        skills = rng.sample(_LANGUAGES, rng.randint(2, 4)) + rng.sample(_TOOLS, rng.randint(2, 4))
+        duties = _CS_DUTIES
+    else:
+        skills = rng.sample(_OTHER_SKILLS, rng.randint(3, 5)) + (rng.sample(_TOOLS, 1) if kind == "cs_no_code" else [])
+        duties = _OTHER_DUTIES
+    lines = [name, email, f"+91 9{rng.randint(100000000, 999999999)}", "", "EDUCATION"]
+    if kind == "self_taught":
+        lines.append("Higher Secondary Certificate, Science stream")
+    else:
+        lines.append(f"{degree}, {rng.choice(['Pune', 'Chennai', 'Delhi', 'Kochi'])} University, {rng.randint(2015, 2024)}")
+    lines += ["", "SKILLS", ", ".join(skills), "", "EXPERIENCE"]
+    for _ in range(rng.randint(2, 5)):
+        lines.append(f"{rng.choice(['Intern', 'Associate', 'Analyst', 'Developer'])}, Company {rng.randint(1, 500)} ({rng.randint(1, 4)} years)")
+        for duty in rng.sample(duties, rng.randint(2, 4)):
+            lines.append("- " + duty.format(n=rng.randint(2, 90)))
+    lines += ["", "PROJECTS"]
+    for _ in range(rng.randint(1, 3)):
+        lines.append(f"- Project {rng.randint(1, 999)}: " + " ".join(rng.sample(skills, min(2, len(skills)))))
+    return lines
+
+
+def make_pdf(lines: list, lines_per_page: int = 48) -> bytes:
+    """Minimal text PDF (Helvetica, one text object per page)."""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    font_id = 3 + len(pages) * 2
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + i * 2} 0 R' for i in range(len(pages)))}] /Count {len(pages)} >>",
+    ]
+    for i, page in enumerate(pages):
+        escaped = (l.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for l in page)
+        body = "BT /F1 10 Tf 14 TL 50 760 Td " + " ".join(f"({l}) Tj T*" for l in escaped) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + i * 2} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def make_docx(lines: list) -> bytes:
+    from docx import Document
+    document = Document()
+    for line in lines:
+        document.add_paragraph(line)
+    fh = io.BytesIO()
+    document.save(fh)
+    return fh.getvalue()
+
+
+class Corpus:
+    """
+    Resume files keyed by Drive file id, and the response sheet rows pointing
+    at them. Rows can outnumber files: submission i uses file i % len(files),
+    so large batches don't have to hold every file in memory. A resubmit_share
+    of the rows repeat an earlier row's email and file, like a form sent twice.
+    """
+
+    def __init__(self, files: dict, rows: list):
+        self.files = files  # file_id -> {"mimeType", "content", "md5Checksum", "modifiedTime", "eligible"}
+        self.rows = rows  # [timestamp, email, resume link]
+
+    @classmethod
+    def generate(cls, submissions: int, distinct_files: int = None, docx_share: float = 0.3,
+                 resubmit_share: float = 0.0, seed: int = 0) -> "Corpus":
+        rng = random.Random(seed)
+        kinds = list(PROFILE_WEIGHTS)
+        weights = list(PROFILE_WEIGHTS.values())
+        files = {}
+        for n in range(min(submissions, distinct_files or submissions)):
+            name = f"{rng.choice(_FIRST)} {rng.choice(_LAST)}"
+            email = f"{name.lower().replace(' ', '.')}{n}@example.com"
+            lines = resume_lines(rng, rng.choices(kinds, weights)[0], name, email)
+            docx = rng.random() < docx_share
+            content = make_docx(lines) if docx else make_pdf(lines)
+            files[f"FILE{n:06d}"] = {
+                "mimeType": DOCX_MIME if docx else PDF_MIME,
+                "content": content,
+                "md5Checksum": hashlib.md5(content).hexdigest(),
+                "modifiedTime": "2024-01-01T00:00:00.000Z",
+                "eligible": qualifies("\n".join(lines)),
+            }
+        file_ids = list(files)
+        rows = []
+        for i in range(submissions):
+            if rows and rng.random() < resubmit_share:
+                rows.append(list(rng.choice(rows)))
+            else:
+                rows.append(["1/1/2024 10:00:00", f"applicant{i}@example.com",
+                             f"https://drive.google.com/open?id={file_ids[i % len(file_ids)]}"])
+        return cls(files, rows)
+
+
+# ---------- GOOGLE SHEETS / DRIVE ----------
+class _Call:
+    def __init__(self, result, latency: float = 0):
+        self._result = result
+        self._latency = latency
+
+    def execute(self, **kwargs):
+        if self._latency:
+            time.sleep(self._latency)
+        return self._result() if callable(self._result) else self._result
+
+
+class _MediaHttp:
+    """What MediaIoBaseDownload needs from an HttpRequest's transport."""
+
+    def __init__(self, content: bytes, latency: float):
+        self.content = content
+        self.latency = latency
+
+    def request(self, uri, method="GET", **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return httplib2.Response({"status": "200", "content-length": str(len(self.content))}), self.content
+
+
+class _A1:
+    # 'Sheet'!B2:B1001, 'Sheet'!1:1
+    PATTERN = re.compile(r"!([A-Z]*)(\d+):([A-Z]*)(\d+)$")
+
+    @staticmethod
+    def column(letters: str) -> int:
+        index = 0
+        for ch in letters:
+            index = index * 26 + ord(ch) - 64
+        return index - 1
+
+
+class FakeSheets:
+    def __init__(self, corpus: Corpus, latency: float = 0):
+        self.grid = [HEADER] + corpus.rows
+        self.latency = latency
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range=None, ranges=None, fields=None):
+        if fields is not None:
+            # spreadsheets().get(): grid size, with some blank rows like a real form sheet
+            return _Call({"sheets": [{"properties": {"gridProperties": {"rowCount": len(self.grid) + 100}}}]}, self.latency)
+        return _Call({"values": self._read(range)}, self.latency)
+
+    def batchGet(self, spreadsheetId, ranges, majorDimension="ROWS"):
+        value_ranges = []
+        for a1 in ranges:
+            rows = self._read(a1)
+            if majorDimension == "COLUMNS":
+                width = max((len(r) for r in rows), default=0)
+                rows = [self._trim([r[i] if i < len(r) else "" for r in rows]) for i in range(width)]
+            value_ranges.append({"values": rows} if rows and rows[0] else {})
+        return _Call({"valueRanges": value_ranges}, self.latency)
+
+    @staticmethod
+    def _trim(values: list) -> list:
+        while values and values[-1] == "":
+            values = values[:-1]
+        return values
+
+    def _read(self, a1: str) -> list:
+        match = _A1.PATTERN.search(a1)
+        first_col, first_row, last_col, last_row = match.groups()
+        rows = self.grid[int(first_row) - 1:int(last_row)]
+        if first_col:
+            start, end = _A1.column(first_col), _A1.column(last_col) + 1
+            rows = [r[start:end] for r in rows]
+        return [self._trim(r) for r in rows]
+
+
+class FakeDrive:
+    def __init__(self, corpus: Corpus, latency: float = 0):
+        self.corpus = corpus
+        self.latency = latency
+
+    def files(self):
+        return self
+
+    def _file(self, file_id: str) -> dict:
+        return self.corpus.files[file_id]
+
+    def get(self, fileId, fields=None):
+        f = self._file(fileId)
+        meta = {
+            "mimeType": f["mimeType"], "md5Checksum": f["md5Checksum"],
+            "modifiedTime": f["modifiedTime"], "size": str(len(f["content"])),
+        }
+        return _Call(meta, self.latency)
+
+    def get_media(self, fileId):
+        return SimpleNamespace(uri=f"fake://drive/{fileId}", headers={}, http=_MediaHttp(self._file(fileId)["content"], self.latency))
+
+    def export_media(self, fileId, mimeType):
+        return self.get_media(fileId)
+
+
+class FakeGoogle:
+    """install(google=FakeGoogle(corpus)) factory: one shared in-memory Sheets and Drive."""
+
+    def __init__(self, corpus: Corpus, latency: float = 0):
+        self.sheets = FakeSheets(corpus, latency)
+        self.drive = FakeDrive(corpus, latency)
+
+    def __call__(self, name: str, version: str):
+        return self.sheets if name == "sheets" else self.drive
+
+
+# ---------- GROQ ----------
+class FakeGroq:
+    """
+    Answers screening prompts (single and batched) with qualifies(), after
+    `latency` seconds (+-50% jitter). A `rate_429` share of calls fail with a
+    429 carrying Retry-After: `retry_after`.
+    """
+
+    _CANDIDATE = re.compile(r"=== CANDIDATE (\d+) ===\n")
+
+    def __init__(self, latency: float = 0.2, rate_429: float = 0.0, retry_after: float = 1.0, seed: int = 0):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.calls = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __call__(self):
+        return self
+
+    def create(self, model, messages, temperature=0, max_tokens=16, **kwargs):
+        with self._lock:
+            self.calls += 1
+            jitter = self._rng.uniform(0.5, 1.5)
+            limited = self._rng.random() < self.rate_429
+            if limited:
+                self.rate_limited += 1
+        time.sleep(self.latency * jitter)
+        if limited:
+            request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+            response = httpx.Response(429, headers={"retry-after": str(self.retry_after)}, request=request)
+            raise RateLimitError("Rate limit reached (fake)", response=response, body=None)
+
+        prompt = messages[-1]["content"]
+        parts = self._CANDIDATE.split(prompt)
+        if len(parts) > 1:
+            # parts: [preamble, "1", text, "2", text, ...]
+            content = "\n".join(
+                f"{number}: {'ELIGIBLE' if qualifies(text) else 'NOT ELIGIBLE'}"
+                for number, text in zip(parts[1::2], parts[2::2])
+            )
+        else:
+            content = "ELIGIBLE" if qualifies(prompt.split("Resume:", 1)[-1]) else "NOT ELIGIBLE"
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        completion_tokens = max(1, len(content) // 4)
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+# ---------- EMAIL ----------
+class MailSink:
+    """Counts messages "sent" through the fake Gmail service or SMTP connections."""
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def deliver(self, count: int = 1):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.sent += count
+
+    # install(gmail=sink.gmail, smtp=sink.smtp)
+    def gmail(self):
+        return _FakeGmail(self)
+
+    def smtp(self, host, port, user, password):
+        return _FakeSmtp(self)
+
+
+class _FakeGmail:
+    def __init__(self, sink: MailSink):
+        self.sink = sink
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def send(self, userId, body):
+        return _Call(lambda: self.sink.deliver() or {"id": "fake"})
+
+    def new_batch_http_request(self, callback):
+        return _FakeGmailBatch(self.sink, callback)
+
+
+class _FakeGmailBatch:
+    def __init__(self, sink: MailSink, callback):
+        self.sink = sink
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request, request_id))
+
+    def execute(self):
+        # One round trip for the whole batch
+        self.sink.deliver(len(self.requests))
+        for _, request_id in self.requests:
+            self.callback(request_id, {"id": "fake"}, None)
+
+
+class _FakeSmtp:
+    def __init__(self, sink: MailSink):
+        self.sink = sink
+
+    def sendmail(self, from_addr, to_addr, message):
+        self.sink.deliver()
+
+    def noop(self):
+        return (250, b"OK")
+
+    def quit(self):
+        pass
+
+
+def install_fakes(corpus: Corpus, google_latency: float = 0.05, groq_latency: float = 0.2,
+                  groq_429_rate: float = 0.0, groq_retry_after: float = 1.0, mail_latency: float = 0.01) -> SimpleNamespace:
+    """Route every external service of this process to the fakes. Returns them, for inspection."""
+    fakes = SimpleNamespace(
+        google=FakeGoogle(corpus, google_latency),
+        groq=FakeGroq(groq_latency, groq_429_rate, groq_retry_after),
+        mail=MailSink(mail_latency),
+    )
+    services.install(google=fakes.google, gmail=fakes.mail.gmail, groq=fakes.groq, smtp=fakes.mail.smtp)
+    return fakes
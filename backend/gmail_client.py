@@ -1,27 +1,46 @@
 import os
 import json
 import base64
+import threading
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
 
-def get_gmail_service():
+_creds = None
+_creds_lock = threading.Lock()
+
+def get_gmail_credentials():
     """
-    Lazy loads Gmail Service from GMAIL_TOKEN env var (Base64 encoded json).
+    Loads Gmail credentials from GMAIL_TOKEN env var (Base64 encoded json) once per process.
+    google-auth refreshes the access token on the shared object when it expires.
     """
-    encoded_token = os.getenv("GMAIL_TOKEN")
-    
-    if not encoded_token:
-        # Fallback for local testing if file exists
-        if os.path.exists("gmail_token.json"):
-            return build('gmail', 'v1', credentials=Credentials.from_authorized_user_file('gmail_token.json', SCOPES))
-        raise ValueError("GMAIL_TOKEN not set in .env")
+    global _creds
+    with _creds_lock:
+        if _creds is not None:
+            return _creds
+
+        encoded_token = os.getenv("GMAIL_TOKEN")
+
+        if not encoded_token:
+            # Fallback for local testing if file exists
+            if os.path.exists("gmail_token.json"):
+                _creds = Credentials.from_authorized_user_file('gmail_token.json', SCOPES)
+                return _creds
+            raise ValueError("GMAIL_TOKEN not set in .env")
 
-    try:
-        decoded_json = base64.b64decode(encoded_token).decode("utf-8")
-        creds_data = json.loads(decoded_json)
-        creds = Credentials.from_authorized_user_info(creds_data, SCOPES)
-        return build('gmail', 'v1', credentials=creds)
-    except Exception as e:
-        raise ValueError(f"Invalid GMAIL_TOKEN: {e}")
+        try:
+            decoded_json = base64.b64decode(encoded_token).decode("utf-8")
+            creds_data = json.loads(decoded_json)
+            _creds = Credentials.from_authorized_user_info(creds_data, SCOPES)
+            return _creds
+        except Exception as e:
+            raise ValueError(f"Invalid GMAIL_TOKEN: {e}")
+
+def get_gmail_service():
+    """
+    Builds a Gmail service from the cached credentials. The discovery document is the
+    static copy bundled with google-api-python-client, so no network call is made here.
+    Services wrap an httplib2 connection, so share one per thread, not across threads.
+    """
+    return build('gmail', 'v1', credentials=get_gmail_credentials(), static_discovery=True)
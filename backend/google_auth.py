@@ -1,7 +1,13 @@
 import os
 import json
 import base64
+import datetime
+import threading
+import httplib2
+from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
 
 # Scopes used across the project
 SCOPES_SHEETS_DRIVE = [
@@ -26,3 +32,46 @@ def get_credentials(scopes):
         creds_dict,
         scopes=scopes
     )
+
+
+# ---------- SHARED SERVICE FACTORY ----------
+# Refresh access tokens this long before they expire, not on the first 401
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+HTTP_TIMEOUT_SECONDS = int(os.getenv("GOOGLE_HTTP_TIMEOUT", "60"))
+
+_shared_creds = {}
+_creds_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_shared_credentials(scopes):
+    """
+    Credentials decoded once per process and scope set, refreshed shortly
+    before expiry. The same object is shared by every thread.
+    """
+    key = tuple(sorted(scopes))
+    with _creds_lock:
+        creds = _shared_creds.get(key)
+        if creds is None:
+            creds = get_credentials(list(key))
+            _shared_creds[key] = creds
+        expiry = creds.expiry
+        if not creds.token or (expiry and expiry - datetime.datetime.utcnow() < TOKEN_REFRESH_MARGIN):
+            creds.refresh(Request())
+        return creds
+
+
+def get_service(name: str, version: str, scopes=SCOPES_SHEETS_DRIVE):
+    """
+    Discovery client for the calling thread. httplib2 is not thread-safe, so each
+    thread gets its own transport and client, built once and reused afterwards.
+    """
+    creds = get_shared_credentials(scopes)
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+    key = (name, version, tuple(sorted(scopes)))
+    if key not in services:
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+        services[key] = build(name, version, http=http, static_discovery=True)
+    return services[key]
@@ -0,0 +1,335 @@
+"""
+Persistent screening queue on top of the app DB.
+
+/process stores a ScreeningJob. A worker claims it, reads the sheet and adds
+one WorkItem per candidate row; items are then leased out in small batches to
+any number of workers. Leases are renewed while a worker is alive, so items and
+sheet reads held by a crashed or redeployed worker are picked up again once
+their lease expires, and a batch continues where it stopped.
+"""
+import datetime
+import json
+import os
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import aliased
+
+from database import SessionLocal, ScreeningJob, WorkItem, OutboundEmail
+
+# ---------- CONFIG ----------
+WORKER_LEASE_SECONDS = int(os.getenv("WORKER_LEASE_SECONDS", "60"))
+# Work items leased per claim
+WORKER_CLAIM_SIZE = int(os.getenv("WORKER_CLAIM_SIZE", "20"))
+# An item leased this many times without finishing is marked as an error
+WORK_ITEM_MAX_ATTEMPTS = int(os.getenv("WORK_ITEM_MAX_ATTEMPTS", "3"))
+
+OPEN_ITEM_STATUSES = ("PENDING", "LEASED")
+# Per-candidate timings in WorkItem.stats, in pipeline order
+TIMED_STAGES = ("download", "extract", "parse", "dedup", "prescreen", "evaluate", "persist")
+
+
+def _lease_deadline(now: datetime.datetime) -> datetime.datetime:
+    return now + datetime.timedelta(seconds=WORKER_LEASE_SECONDS)
+
+
+def enqueue_job(db, batch_id: int, user_id: int, request: dict) -> ScreeningJob:
+    """Queue a screening run for a batch. The caller commits."""
+    job = ScreeningJob(id=batch_id, user_id=user_id, request=json.dumps(request))
+    db.add(job)
+    return job
+
+
+def claim_job_to_read(worker_id: str):
+    """
+    Lease the oldest job whose sheet hasn't been fully read: new jobs, and
+    jobs whose reader stopped holding the lease. Returns the job id or None.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        candidates = db.query(ScreeningJob.id).filter(
+            ScreeningJob.status.in_(("QUEUED", "RUNNING")),
+            ScreeningJob.expanded.isnot(True),
+            or_(ScreeningJob.lease_expires_at.is_(None), ScreeningJob.lease_expires_at < now)
+        ).order_by(ScreeningJob.id).limit(5).all()
+        for (job_id,) in candidates:
+            # Conditional update so two workers never read the same sheet
+            updated = db.query(ScreeningJob).filter(
+                ScreeningJob.id == job_id,
+                ScreeningJob.expanded.isnot(True),
+                or_(ScreeningJob.lease_expires_at.is_(None), ScreeningJob.lease_expires_at < now)
+            ).update({
+                "status": "RUNNING",
+                "lease_owner": worker_id,
+                "lease_expires_at": _lease_deadline(now)
+            }, synchronize_session=False)
+            db.commit()
+            if updated:
+                return job_id
+        return None
+    finally:
+        db.close()
+
+
+def add_work_items(db, job_id: int, rows: list, rows_read: int, duplicates: dict = None):
+    """
+    Store a chunk of (row, email, resume_link) candidates and advance the read
+    position. Rows in `duplicates` (row -> earlier row) are stored as done
+    DUPLICATE items and never screened.
+    """
+    duplicates = duplicates or {}
+    db.bulk_insert_mappings(WorkItem, [
+        {"job_id": job_id, "row": row, "email": email, "resume_link": link, "status": "PENDING", "attempts": 0}
+        if row not in duplicates else
+        {"job_id": job_id, "row": row, "email": email, "resume_link": link, "status": "DONE", "attempts": 0,
+         "result": "DUPLICATE", "duplicate_of_row": duplicates[row]}
+        for row, email, link in rows
+    ])
+    db.query(ScreeningJob).filter(ScreeningJob.id == job_id).update(
+        {"rows_read": rows_read}, synchronize_session=False
+    )
+    db.commit()
+
+
+def claim_work_items(worker_id: str, limit: int = WORKER_CLAIM_SIZE) -> list:
+    """
+    Lease up to `limit` pending (or abandoned) items of running jobs, oldest
+    job first. Returns dicts with id, job_id, row, email, resume_link, attempts
+    and an empty stats dict for the stages to fill in.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        rows = db.query(WorkItem.id).join(ScreeningJob, ScreeningJob.id == WorkItem.job_id).filter(
+            ScreeningJob.status == "RUNNING",
+            or_(
+                WorkItem.status == "PENDING",
+                (WorkItem.status == "LEASED") & (WorkItem.lease_expires_at < now)
+            )
+        ).order_by(WorkItem.job_id, WorkItem.id).limit(limit).all()
+
+        claimed = []
+        for (item_id,) in rows:
+            updated = db.query(WorkItem).filter(
+                WorkItem.id == item_id,
+                or_(
+                    WorkItem.status == "PENDING",
+                    (WorkItem.status == "LEASED") & (WorkItem.lease_expires_at < now)
+                )
+            ).update({
+                "status": "LEASED",
+                "lease_owner": worker_id,
+                "lease_expires_at": _lease_deadline(now),
+                "attempts": WorkItem.attempts + 1
+            }, synchronize_session=False)
+            if updated:
+                claimed.append(item_id)
+        db.commit()
+        if not claimed:
+            return []
+
+        items = db.query(WorkItem).filter(WorkItem.id.in_(claimed)).order_by(WorkItem.id).all()
+        return [
+            {"id": i.id, "job_id": i.job_id, "row": i.row, "email": i.email,
+             "resume_link": i.resume_link, "attempts": i.attempts, "stats": {}}
+            for i in items
+        ]
+    finally:
+        db.close()
+
+
+def renew_leases(worker_id: str):
+    """Push back the lease deadline of everything this worker holds."""
+    db = SessionLocal()
+    try:
+        deadline = _lease_deadline(datetime.datetime.utcnow())
+        db.query(WorkItem).filter(
+            WorkItem.lease_owner == worker_id,
+            WorkItem.status == "LEASED"
+        ).update({"lease_expires_at": deadline}, synchronize_session=False)
+        db.query(ScreeningJob).filter(
+            ScreeningJob.lease_owner == worker_id,
+            ScreeningJob.status.in_(("RUNNING", "FINISHING"))
+        ).update({"lease_expires_at": deadline}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def release_job_leases(worker_id: str):
+    """Let other workers take over this worker's jobs right away (on shutdown)."""
+    db = SessionLocal()
+    try:
+        db.query(ScreeningJob).filter(ScreeningJob.lease_owner == worker_id).update(
+            {"lease_owner": None, "lease_expires_at": None}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def complete_work_item(db, item_id: int, result: str, error: str = None, stats: dict = None, result_id: int = None,
+                       permanent: bool = False):
+    """
+    Mark an item finished. Errors are final too (the result records them);
+    `permanent` ones won't pass on a later run either. The caller commits.
+    """
+    db.query(WorkItem).filter(WorkItem.id == item_id).update({
+        "status": "FAILED" if error else "DONE",
+        "result": result,
+        "error": error,
+        "permanent": permanent,
+        "stats": json.dumps(stats) if stats else None,
+        "result_id": result_id,
+        "lease_owner": None,
+        "lease_expires_at": None
+    }, synchronize_session=False)
+
+
+def claim_finished_jobs(worker_id: str) -> list:
+    """
+    Move fully read jobs with no open items to FINISHING, leased to this
+    worker, and return their ids. finish_job() completes them.
+    Jobs left FINISHING by a crashed worker are claimed again.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        open_items = db.query(WorkItem.id).filter(
+            WorkItem.job_id == ScreeningJob.id,
+            WorkItem.status.in_(OPEN_ITEM_STATUSES)
+        ).exists()
+        ready = db.query(ScreeningJob.id).filter(
+            or_(
+                (ScreeningJob.status == "RUNNING") & (ScreeningJob.expanded.is_(True)),
+                (ScreeningJob.status == "FINISHING") & (ScreeningJob.lease_expires_at < now)
+            ),
+            ~open_items
+        ).all()
+        claimed = []
+        for (job_id,) in ready:
+            updated = db.query(ScreeningJob).filter(
+                ScreeningJob.id == job_id,
+                or_(
+                    ScreeningJob.status == "RUNNING",
+                    (ScreeningJob.status == "FINISHING") & (ScreeningJob.lease_expires_at < now)
+                )
+            ).update({
+                "status": "FINISHING",
+                "lease_owner": worker_id,
+                "lease_expires_at": _lease_deadline(now)
+            }, synchronize_session=False)
+            if updated:
+                claimed.append(job_id)
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def finish_job(db, job_id: int, status: str = "DONE"):
+    db.query(ScreeningJob).filter(ScreeningJob.id == job_id).update({
+        "status": status,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "finished_at": datetime.datetime.utcnow()
+    }, synchronize_session=False)
+    db.commit()
+
+
+def item_counts(db, job_id: int) -> dict:
+    """Work item count per result (ELIGIBLE, SKIPPED, ERROR, ...) plus "open"."""
+    counts = {}
+    for status, result, count in db.query(WorkItem.status, WorkItem.result, func.count(WorkItem.id)).filter(
+        WorkItem.job_id == job_id
+    ).group_by(WorkItem.status, WorkItem.result):
+        key = "open" if status in OPEN_ITEM_STATUSES else result
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def screened_rows(db, job_id: int) -> list:
+    """(row, email, resume_link) of a job's items, without the collapsed duplicates."""
+    return db.query(WorkItem.row, WorkItem.email, WorkItem.resume_link).filter(
+        WorkItem.job_id == job_id,
+        WorkItem.duplicate_of_row.is_(None)
+    ).all()
+
+
+def duplicate_items(db, job_id: int) -> list:
+    """
+    Collapsed duplicate items without a result yet, as (item, result_id and
+    result of the row they repeat).
+    """
+    original = aliased(WorkItem)
+    return db.query(WorkItem, original.result_id, original.result).join(
+        original, (original.job_id == WorkItem.job_id) & (original.row == WorkItem.duplicate_of_row)
+    ).filter(
+        WorkItem.job_id == job_id,
+        WorkItem.duplicate_of_row.isnot(None),
+        WorkItem.result_id.is_(None)
+    ).order_by(WorkItem.row).all()
+
+
+def first_failed_row(db, job_id: int):
+    """First row that failed for a reason a later run may not hit (network, rate limits), or None."""
+    return db.query(func.min(WorkItem.row)).filter(
+        WorkItem.job_id == job_id,
+        WorkItem.status == "FAILED",
+        WorkItem.permanent.isnot(True)
+    ).scalar()
+
+
+def _percentiles(values: list) -> dict:
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p))]
+    return {
+        "count": len(values), "total": round(sum(values), 3),
+        "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1],
+    }
+
+
+def _item_stats(db, job_id: int) -> dict:
+    """Stage timing percentiles and byte/token totals over a job's finished items."""
+    seconds = {stage: [] for stage in TIMED_STAGES}
+    totals = {"candidates": 0, "bytes": 0, "tokens": 0}
+    for (raw,) in db.query(WorkItem.stats).filter(WorkItem.job_id == job_id, WorkItem.stats.isnot(None)).yield_per(1000):
+        stats = json.loads(raw)
+        totals["candidates"] += 1
+        totals["bytes"] += stats.get("bytes", 0)
+        totals["tokens"] += stats.get("tokens", 0)
+        for stage in TIMED_STAGES:
+            if stage in stats:
+                seconds[stage].append(stats[stage])
+    totals["stages"] = {stage: _percentiles(values) for stage, values in seconds.items() if values}
+    return totals
+
+
+def save_job_stats(db, job_id: int) -> dict:
+    """Summarize the items' stats onto the job, so they outlive purged work items. The caller commits."""
+    stats = _item_stats(db, job_id)
+    db.query(ScreeningJob).filter(ScreeningJob.id == job_id).update(
+        {"stats": json.dumps(stats)}, synchronize_session=False
+    )
+    return stats
+
+
+def job_stats(db, job_id: int) -> dict:
+    """
+    Stage timings of a job: saved at finish, or computed from the items while
+    it runs. Emails are sent after the job finishes, so notify is always live.
+    """
+    saved = db.query(ScreeningJob.stats).filter(ScreeningJob.id == job_id).scalar()
+    stats = json.loads(saved) if saved else _item_stats(db, job_id)
+    sends = [s for (s,) in db.query(OutboundEmail.send_seconds).filter(
+        OutboundEmail.batch_id == job_id, OutboundEmail.send_seconds.isnot(None)
+    )]
+    if sends:
+        stats["stages"]["notify"] = _percentiles(sends)
+    return stats
+
+
+def stats_summary(stats: dict) -> str:
+    parts = [f"{stage} p50 {s['p50']:.2f}s p95 {s['p95']:.2f}s" for stage, s in stats["stages"].items()]
+    parts.append(f"{stats['bytes'] / 1e6:.1f} MB downloaded, {stats['tokens']} model tokens")
+    return "Stage timings: " + ", ".join(parts)
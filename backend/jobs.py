@@ -0,0 +1,183 @@
+"""
+Progress of screening jobs, shared through the DB so any API process can serve
+/logs, /results and the event stream of a job screened by any worker.
+Log lines and results are JobEvent rows; the row id is the client cursor.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import func
+
+from database import SessionLocal, ScreeningJob, WorkItem, JobEvent
+
+# ---------- CONFIG ----------
+# Max log lines returned per request (older lines past the cursor are skipped)
+JOB_LOG_LIMIT = int(os.getenv("JOB_LOG_LIMIT", "2000"))
+# Events of finished jobs are kept around this long so clients can fetch the tail
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# Workers buffer events and write them in batches
+JOB_EVENT_FLUSH_SECONDS = float(os.getenv("JOB_EVENT_FLUSH_SECONDS", "1"))
+JOB_EVENT_FLUSH_SIZE = int(os.getenv("JOB_EVENT_FLUSH_SIZE", "100"))
+
+
+class Job:
+    """
+    Writer for one job's events inside a worker. Lines are buffered and
+    written together once JOB_EVENT_FLUSH_SIZE are waiting or
+    JOB_EVENT_FLUSH_SECONDS have passed; call flush() before going idle.
+    """
+
+    def __init__(self, job_id: int, user_id: int):
+        self.id = job_id
+        self.user_id = user_id
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def log(self, msg: str):
+        timestamp = time.strftime("%H:%M:%S")
+        line = f"[{timestamp}] {msg}"
+        print(f"[job {self.id}] {line}")
+        self._append("log", {"line": line})
+
+    def add_result(self, email: str, status: str):
+        self._append("result", {"email": email, "status": status})
+
+    def _append(self, kind: str, data: dict):
+        with self._lock:
+            self._pending.append({"job_id": self.id, "kind": kind, "data": json.dumps(data)})
+            due = len(self._pending) >= JOB_EVENT_FLUSH_SIZE or time.monotonic() - self._last_flush >= JOB_EVENT_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        # Held while writing, so events from different threads keep their order
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+            if not pending:
+                return
+            db = SessionLocal()
+            try:
+                db.bulk_insert_mappings(JobEvent, pending)
+                db.commit()
+            finally:
+                db.close()
+
+
+class JobView:
+    """Read side of a job for the API routes. Every call reads the DB."""
+
+    def __init__(self, job_id: int, user_id: int):
+        self.id = job_id
+        self.user_id = user_id
+
+    def _state(self, db):
+        """(finished, progress percent) from the job row and its work item counts."""
+        job = db.get(ScreeningJob, self.id)
+        if job.status in ("DONE", "FAILED"):
+            return True, 100
+        finished_items = db.query(func.count(WorkItem.id)).filter(
+            WorkItem.job_id == self.id,
+            WorkItem.status.in_(("DONE", "FAILED"))
+        ).scalar()
+        return False, min(99, int(finished_items / max(1, job.total_rows or 0) * 100))
+
+    def _logs(self, db, cursor: int) -> list:
+        # Newest JOB_LOG_LIMIT lines after the cursor, oldest first
+        rows = db.query(JobEvent.id, JobEvent.data).filter(
+            JobEvent.job_id == self.id,
+            JobEvent.kind == "log",
+            JobEvent.id > cursor
+        ).order_by(JobEvent.id.desc()).limit(JOB_LOG_LIMIT).all()
+        return [(seq, json.loads(data)) for seq, data in reversed(rows)]
+
+    def _results(self, db, cursor: int) -> list:
+        rows = db.query(JobEvent.id, JobEvent.data).filter(
+            JobEvent.job_id == self.id,
+            JobEvent.kind == "result",
+            JobEvent.id > cursor
+        ).order_by(JobEvent.id).all()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    @property
+    def finished(self) -> bool:
+        db = SessionLocal()
+        try:
+            return self._state(db)[0]
+        finally:
+            db.close()
+
+    @property
+    def progress(self) -> int:
+        db = SessionLocal()
+        try:
+            return self._state(db)[1]
+        finally:
+            db.close()
+
+    def logs_after(self, cursor: int = 0):
+        """Return (lines, next_cursor) for log lines with a sequence above cursor."""
+        db = SessionLocal()
+        try:
+            logs = self._logs(db, cursor)
+        finally:
+            db.close()
+        return [data["line"] for _, data in logs], logs[-1][0] if logs else cursor
+
+    def results_after(self, cursor: int = 0):
+        """Return (results, next_cursor) for results with a sequence above cursor."""
+        db = SessionLocal()
+        try:
+            results = self._results(db, cursor)
+        finally:
+            db.close()
+        return [data for _, data in results], results[-1][0] if results else cursor
+
+    def poll(self, cursor: int = 0):
+        """
+        (finished, progress, events) in one session, for the event stream.
+        Events are (seq, type, data) tuples above cursor, in order.
+        """
+        db = SessionLocal()
+        try:
+            # State first, so a job seen as finished has all its events below
+            finished, progress = self._state(db)
+            events = [(seq, "log", data) for seq, data in self._logs(db, cursor)]
+            events += [(seq, "result", data) for seq, data in self._results(db, cursor)]
+        finally:
+            db.close()
+        return finished, progress, sorted(events, key=lambda e: e[0])
+
+
+# ---------- REGISTRY ----------
+def get_job(job_id: int, user_id: int):
+    """Return the job if it exists and belongs to the user, else None."""
+    db = SessionLocal()
+    try:
+        job = db.query(ScreeningJob.id).filter(
+            ScreeningJob.id == job_id,
+            ScreeningJob.user_id == user_id
+        ).first()
+    finally:
+        db.close()
+    return JobView(job_id, user_id) if job else None
+
+
+def purge_finished_jobs():
+    """Drop events and work items of jobs that finished more than JOB_RETENTION_SECONDS ago."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=JOB_RETENTION_SECONDS)
+    db = SessionLocal()
+    try:
+        old = db.query(ScreeningJob.id).filter(
+            ScreeningJob.status.in_(("DONE", "FAILED")),
+            ScreeningJob.finished_at < cutoff
+        ).subquery()
+        db.query(JobEvent).filter(JobEvent.job_id.in_(old.select())).delete(synchronize_session=False)
+        db.query(WorkItem).filter(WorkItem.job_id.in_(old.select())).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
@@ -1,30 +1,52 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-import io
+import asyncio
+import datetime
+import json
 import os
-import time
 
-from google_auth import get_credentials, SCOPES_SHEETS_DRIVE
-from resume_reader import extract_text
-from ai_evaluator import check_resume
-from email_sender import send_email
-from calendar_invite import schedule_interview
+from fastapi.concurrency import run_in_threadpool
+from resume_reader import get_extractor_pool
+from outbox import outbox_sender, register_smtp_config, SENDER_ID
+from jobs import JobView, get_job
+from job_queue import enqueue_job, job_stats
+from metrics import metrics_response
+from prescreen import report as prescreen_report, PRESCREEN_REJECT_BELOW, PRESCREEN_ACCEPT_ABOVE
+from screening import SheetRequest
+from worker import job_worker
 from database import init_db, SessionLocal, ScreeningBatch, CandidateResult, User, get_db
-from auth import get_password_hash, verify_password, create_access_token, get_current_user
+from auth import get_password_hash_async, verify_password_async, create_access_token, get_current_user, get_user_from_token
 from fastapi import Depends, HTTPException
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
 
 app = FastAPI()
 
+# Send result emails from this process (set to 0 when running `python outbox.py` separately)
+OUTBOX_IN_PROCESS = os.getenv("OUTBOX_IN_PROCESS", "1") == "1"
+# Screen queued jobs in this process too (set to 0 when running `python worker.py` separately)
+JOB_WORKER_IN_PROCESS = os.getenv("JOB_WORKER_IN_PROCESS", "1") == "1"
+
 @app.on_event("startup")
 def on_startup():
     init_db()
     port = os.getenv("PORT", "unknown")
     print(f"--- NexusHire AI Starting on Port: {port} ---")
 
+    if OUTBOX_IN_PROCESS:
+        outbox_sender.start()
+    if JOB_WORKER_IN_PROCESS:
+        job_worker.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    if JOB_WORKER_IN_PROCESS:
+        job_worker.stop()
+    get_extractor_pool().shutdown()
+    outbox_sender.stop()
+
 # ---------- CORS ----------
 app.add_middleware(
     CORSMiddleware,
@@ -34,190 +56,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ---------- GLOBAL STATE ----------
-LOGS = []
-RESULTS = []
-
-def log(msg: str):
-    timestamp = time.strftime("%H:%M:%S")
-    LOGS.append(f"[{timestamp}] {msg}")
-
-# ---------- REQUEST MODEL ----------
-class SheetRequest(BaseModel):
-    sheet_link: str
-    company_name: str = "DUDE TECH"
-    tagline: str = "Building smart hiring systems"
-    role_name: str = "Software Engineer"
-    role_requirements: str = "Programming skills AND CS/IT education"
-    use_own_smtp: bool = False
-    smtp_config: dict = None
-
-# ---------- HELPERS ----------
-def get_services():
-    """Lazy load services to avoid startup crash if creds are missing"""
-    print("Loading Google Credentials...")
-    creds = get_credentials(SCOPES_SHEETS_DRIVE)
-    sheets = build("sheets", "v4", credentials=creds)
-    drive = build("drive", "v3", credentials=creds)
-    return sheets, drive
-
-def extract_sheet_id(link: str):
-    return link.split("/d/")[1].split("/")[0]
-
-def extract_file_id(link: str):
-    if "id=" in link:
-        return link.split("id=")[1]
-    return link.split("/d/")[1].split("/")[0]
-
-def download_resume(drive_service, file_id: str, filename: str):
-    request = drive_service.files().get_media(fileId=file_id)
-    fh = io.FileIO(filename, "wb")
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
-
-# ---------- BACKGROUND JOB ----------
-def run_processing(req: SheetRequest, user_id: int):
-    LOGS.clear()
-    RESULTS.clear()
+# ---------- ROUTES ----------
+# ---------- AUTH ROUTES ----------
+# Async so pbkdf2 runs on the auth module's hashing threads; DB calls go to the threadpool
+def _find_user(email: str):
+    db = SessionLocal()
+    try:
+        return db.query(User.id, User.email, User.hashed_password).filter(User.email == email).first()
+    finally:
+        db.close()
 
+def _create_user(email: str, hashed_password: str) -> bool:
     db = SessionLocal()
     try:
-        log("Initializing services...")
-        try:
-            sheets_service, drive_service = get_services()
-        except Exception as e:
-            log(f"CRITICAL ERROR: Failed to load Google Credentials: {e}")
-            return
-
-        log(f"Started screening for {req.role_name} at {req.company_name}")
-
-        sheet_id = extract_sheet_id(req.sheet_link)
-        result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=sheet_id,
-            range="Form Responses 1"
-        ).execute()
-
-        rows = result.get("values", [])
-
-        if len(rows) < 2:
-            log("No responses found in Google Sheet")
-            log("All resumes processed")
-            return
-
-        headers = rows[0]
-        data_rows = rows[1:]
-        total_rows = len(data_rows)
-
-        lower_headers = [h.lower().strip() for h in headers]
-        
-        try:
-            email_idx = -1
-            resume_idx = -1
-            for i, h in enumerate(lower_headers):
-                if "email" in h: email_idx = i
-                if "resume" in h or "upload" in h or "cv" in h: resume_idx = i
-
-            if email_idx == -1 or resume_idx == -1:
-                log(f"Error: Columns not found. Headers: {headers}")
-                return
-        except Exception as e:
-            log(f"Header parsing error: {e}")
-            return
-
-        # Save Batch to DB
-        new_batch = ScreeningBatch(
-            user_id=user_id,
-            company_name=req.company_name,
-            tagline=req.tagline,
-            role_name=req.role_name,
-            role_requirements=req.role_requirements
-        )
-        db.add(new_batch)
+        db.add(User(email=email, hashed_password=hashed_password))
         db.commit()
-        db.refresh(new_batch)
-
-        for i, row in enumerate(data_rows, start=1):
-            progress = int((i / total_rows) * 100)
-            if len(row) <= max(email_idx, resume_idx):
-                log(f"[{progress}%] Skipping empty row {i}")
-                continue
-
-            email = row[email_idx]
-            resume_link = row[resume_idx]
-
-            log(f"[{progress}%] Processing {email}")
-
-            try:
-                file_id = extract_file_id(resume_link)
-                filename = f"resume_{i}.pdf"
-
-                log(f"[{progress}%] Analyzing {email}...")
-                download_resume(drive_service, file_id, filename)
-                resume_text = extract_text(filename)
-                
-                decision = check_resume(resume_text, req.role_name, req.role_requirements)
-                status = "ELIGIBLE" if decision.startswith("ELIGIBLE") else "NOT ELIGIBLE"
-
-                log(f"[{progress}%] Sending result to {email}...")
-                if status == "ELIGIBLE":
-                    meet = schedule_interview()
-                    send_email(
-                        email, f"ELIGIBLE\nMeet: {meet}",
-                        company_name=req.company_name,
-                        tagline=req.tagline,
-                        role_name=req.role_name,
-                        use_own_smtp=req.use_own_smtp,
-                        smtp_config=req.smtp_config
-                    )
-                else:
-                    send_email(
-                        email, "NOT ELIGIBLE",
-                        company_name=req.company_name,
-                        tagline=req.tagline,
-                        role_name=req.role_name,
-                        use_own_smtp=req.use_own_smtp,
-                        smtp_config=req.smtp_config
-                    )
-
-                RESULTS.append({"email": email, "status": status})
-                
-                # Save Individual Result to DB
-                new_res = CandidateResult(batch_id=new_batch.id, email=email, status=status)
-                db.add(new_res)
-                db.commit()
-
-                if os.path.exists(filename): os.remove(filename)
-
-            except Exception as e:
-                log(f"[{progress}%] ERROR for {email}: {str(e)}")
-                RESULTS.append({"email": email, "status": "ERROR"})
-
-        log("100% - All resumes processed")
-    except Exception as e:
-        log(f"FATAL ERROR: {str(e)}")
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
     finally:
         db.close()
 
-# ---------- ROUTES ----------
-# ---------- AUTH ROUTES ----------
 @app.post("/register")
-def register(email: str, password: str, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == email).first()
-    if db_user:
+async def register(email: str, password: str):
+    if await run_in_threadpool(_find_user, email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    hashed_password = await get_password_hash_async(password)
+    if not await run_in_threadpool(_create_user, email, hashed_password):
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    new_user = User(email=email, hashed_password=get_password_hash(password))
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
     return {"status": "success"}
 
 @app.post("/login")
-def login(email: str, password: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def login(email: str, password: str):
+    user = await run_in_threadpool(_find_user, email)
+    if not user or not await verify_password_async(password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     access_token = create_access_token(data={"sub": user.email})
@@ -228,42 +102,183 @@ def login(email: str, password: str, db: Session = Depends(get_db)):
 def health_check():
     return {"status": "ok", "message": "NexusHire AI Secure API is running"}
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage and external call latencies, in-flight gauges, errors."""
+    body, content_type = metrics_response()
+    return Response(body, media_type=content_type)
+
 @app.post("/process")
-def start(data: SheetRequest, bg: BackgroundTasks, user: dict = Depends(get_current_user)):
-    bg.add_task(run_processing, data, user["id"])
-    return {"status": "started"}
+def start(data: SheetRequest, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    if data.use_own_smtp and data.smtp_config and not OUTBOX_IN_PROCESS:
+        # Nothing else could ever send these: SMTP credentials only live in this process
+        raise HTTPException(status_code=400, detail="Custom SMTP needs the API's own email sender (OUTBOX_IN_PROCESS=1)")
+    # The batch row is created up front so its id can key the job
+    new_batch = ScreeningBatch(
+        user_id=user["id"],
+        company_name=data.company_name,
+        tagline=data.tagline,
+        role_name=data.role_name,
+        role_requirements=data.role_requirements,
+        eligible_template=data.eligible_template,
+        rejected_template=data.rejected_template
+    )
+    # SMTP credentials stay in this process's memory, the queued request only says to use them
+    use_own_smtp = bool(data.use_own_smtp and data.smtp_config)
+    if use_own_smtp:
+        # Other senders fail these emails only after this process stops renewing the heartbeat
+        new_batch.smtp_owner = SENDER_ID
+        new_batch.smtp_heartbeat_at = datetime.datetime.utcnow()
+    db.add(new_batch)
+    db.flush()
+
+    request = data.model_dump(exclude={"smtp_config"}, exclude_none=True)
+    request["use_own_smtp"] = use_own_smtp
+    enqueue_job(db, new_batch.id, user["id"], request)
+    db.commit()
+
+    if use_own_smtp:
+        register_smtp_config(new_batch.id, data.smtp_config)
+    job_worker.wake()
+    return {"status": "started", "job_id": new_batch.id}
+
+def _get_user_job(job_id: int, user: dict) -> JobView:
+    job = get_job(job_id, user["id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.get("/logs")
-def get_logs(user: dict = Depends(get_current_user)):
-    return {"logs": LOGS}
+def get_logs(job_id: int, cursor: int = 0, user: dict = Depends(get_current_user)):
+    job = _get_user_job(job_id, user)
+    # State first, so a job seen as finished has all its lines in this response
+    finished = job.finished
+    lines, next_cursor = job.logs_after(cursor)
+    return {"logs": lines, "cursor": next_cursor, "finished": finished}
 
 @app.get("/results")
-def get_results(user: dict = Depends(get_current_user)):
-    return {"results": RESULTS}
+def get_results(job_id: int, cursor: int = 0, user: dict = Depends(get_current_user)):
+    job = _get_user_job(job_id, user)
+    finished = job.finished
+    results, next_cursor = job.results_after(cursor)
+    return {"results": results, "cursor": next_cursor, "finished": finished}
+
+@app.get("/jobs/{job_id}/stats")
+def get_job_stats(job_id: int, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Per-stage timing percentiles (seconds), downloaded bytes and model tokens of a job."""
+    job = _get_user_job(job_id, user)
+    return {"job_id": job_id, "finished": job.finished, **job_stats(db, job_id)}
+
+# How often an open event stream checks its job for new entries
+STREAM_POLL_SECONDS = 0.5
+
+def _sse(event: str, data: dict, event_id: int = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: int, request: Request, token: str, last_event_id: int = 0):
+    """
+    Server-sent events for one job: `log`, `result` and `progress` events, then `done`.
+    EventSource can't send headers, so the token comes as a query parameter and is
+    checked once per connection. Reconnects resume after the Last-Event-ID header.
+    """
+    job = await run_in_threadpool(lambda: _get_user_job(job_id, get_user_from_token(token)))
+
+    cursor = int(request.headers.get("last-event-id") or last_event_id)
+
+    async def events():
+        nonlocal cursor
+        progress = None
+        while True:
+            finished, percent, new_events = await run_in_threadpool(job.poll, cursor)
+            for seq, event, data in new_events:
+                yield _sse(event, data, seq)
+                cursor = seq
+            if percent != progress:
+                progress = percent
+                yield _sse("progress", {"percent": progress})
+            if finished:
+                yield _sse("done", {"cursor": cursor})
+                return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Page sizes for the history endpoints (keyset pagination, pass next_cursor back to continue)
+HISTORY_PAGE_SIZE = 50
+RESULTS_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
 
 @app.get("/history")
-def get_history(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    batches = db.query(ScreeningBatch).filter(ScreeningBatch.user_id == user["id"]).order_by(ScreeningBatch.timestamp.desc()).all()
+def get_history(before: int = None, limit: int = HISTORY_PAGE_SIZE, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Batches newest first, with result counts from one aggregate query."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(
+        ScreeningBatch.id,
+        ScreeningBatch.company_name,
+        ScreeningBatch.role_name,
+        ScreeningBatch.timestamp,
+        func.count(CandidateResult.id),
+        func.coalesce(func.sum(case((CandidateResult.status == "ELIGIBLE", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((CandidateResult.status == "NOT ELIGIBLE", 1), else_=0)), 0),
+    ).outerjoin(CandidateResult, and_(
+        CandidateResult.batch_id == ScreeningBatch.id,
+        # Collapsed repeat submissions are kept for auditing but aren't candidates of their own
+        or_(CandidateResult.dedup_kind.is_(None), CandidateResult.dedup_kind != "submission")
+    )).filter(
+        ScreeningBatch.user_id == user["id"]
+    )
+    if before is not None:
+        query = query.filter(ScreeningBatch.id < before)
+    rows = query.group_by(ScreeningBatch.id).order_by(ScreeningBatch.id.desc()).limit(limit + 1).all()
+
     history = []
-    for b in batches:
+    for batch_id, company, role, timestamp, count, eligible, not_eligible in rows[:limit]:
         history.append({
-            "id": b.id,
-            "company": b.company_name,
-            "role": b.role_name,
-            "date": b.timestamp.strftime("%Y-%m-%d %H:%M"),
-            "count": len(b.results)
+            "id": batch_id,
+            "company": company,
+            "role": role,
+            "date": timestamp.strftime("%Y-%m-%d %H:%M"),
+            "count": count,
+            "eligible": eligible,
+            "not_eligible": not_eligible
         })
-    return {"history": history}
+    next_cursor = history[-1]["id"] if len(rows) > limit else None
+    return {"history": history, "next_cursor": next_cursor}
 
 @app.get("/history/{batch_id}")
-def get_batch_results(batch_id: int, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_batch_results(batch_id: int, after: int = 0, limit: int = RESULTS_PAGE_SIZE, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     batch = db.query(ScreeningBatch).filter(ScreeningBatch.id == batch_id, ScreeningBatch.user_id == user["id"]).first()
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
-    
-    results = [{"email": r.email, "status": r.status} for r in batch.results]
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = db.query(
+        CandidateResult.id, CandidateResult.email, CandidateResult.status, CandidateResult.email_status,
+        CandidateResult.decided_by, CandidateResult.prescreen_score, CandidateResult.duplicate_of,
+        CandidateResult.dedup_kind, CandidateResult.dedup_similarity
+    ).filter(
+        CandidateResult.batch_id == batch_id,
+        CandidateResult.id > after
+    ).order_by(CandidateResult.id).limit(limit + 1).all()
+
+    results = [
+        {"email": email, "status": status, "email_status": email_status, "decided_by": decided_by, "prescreen_score": score,
+         "duplicate_of": duplicate_of, "dedup_kind": dedup_kind, "dedup_similarity": similarity}
+        for _, email, status, email_status, decided_by, score, duplicate_of, dedup_kind, similarity in rows[:limit]
+    ]
     return {
         "company": batch.company_name,
         "role": batch.role_name,
-        "results": results
+        "results": results,
+        "next_cursor": rows[limit - 1][0] if len(rows) > limit else None
     }
+
+@app.get("/prescreen/report")
+def get_prescreen_report(reject_below: float = PRESCREEN_REJECT_BELOW, accept_above: float = PRESCREEN_ACCEPT_ABOVE,
+                         user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Pre-screen scores against model verdicts on past batches, and what these thresholds would decide."""
+    return prescreen_report(db, user["id"], reject_below, accept_above)
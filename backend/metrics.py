@@ -0,0 +1,139 @@
+"""
+Prometheus metrics for the screening pipeline and the external services it
+calls (Drive, Sheets, Groq, Gmail, SMTP), served at /metrics by the API and on
+WORKER_METRICS_PORT by standalone workers.
+
+Each process counts its own work. When the API runs several processes, set
+PROMETHEUS_MULTIPROC_DIR to a shared empty directory so /metrics adds them up.
+
+Jobs submitted with profile=true also get a cProfile of their stage calls.
+"""
+import cProfile
+import os
+import pstats
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+
+# ---------- CONFIG ----------
+# Port for a standalone worker's own /metrics (0 = don't serve)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+# Where profiled jobs are saved, one .prof file per job and worker process
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "screening_stage_seconds", "Time spent in a pipeline stage call (one call may handle a batch)",
+    ["stage"], buckets=_SECONDS_BUCKETS
+)
+STAGE_IN_FLIGHT = Gauge(
+    "screening_stage_in_flight", "Candidates currently inside a pipeline stage", ["stage"],
+    multiprocess_mode="livesum"
+)
+STAGE_ERRORS = Counter("screening_stage_errors_total", "Candidates that failed in a pipeline stage", ["stage"])
+
+SERVICE_SECONDS = Histogram(
+    "external_call_seconds", "Latency of calls to external services",
+    ["service", "call"], buckets=_SECONDS_BUCKETS
+)
+SERVICE_IN_FLIGHT = Gauge(
+    "external_calls_in_flight", "Calls to external services currently waiting for an answer", ["service"],
+    multiprocess_mode="livesum"
+)
+SERVICE_ERRORS = Counter("external_call_errors_total", "Failed calls to external services", ["service", "call"])
+
+DOWNLOADED_BYTES = Counter("resume_downloaded_bytes_total", "Resume bytes downloaded from Drive")
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens used by model completions", ["kind"])
+CANDIDATES = Counter("screening_candidates_total", "Screened candidates by result", ["result"])
+DEDUP = Counter("dedup_candidates_total", "Duplicates found, by kind (submission or resume)", ["kind"])
+PRESCREEN = Counter("prescreen_candidates_total", "Pre-screened candidates by outcome (ELIGIBLE, NOT ELIGIBLE or model)", ["outcome"])
+
+_local = threading.local()
+
+
+@contextmanager
+def track_call(service: str, call: str):
+    """Time one external call and count it as an error if it raises."""
+    SERVICE_IN_FLIGHT.labels(service).inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SERVICE_ERRORS.labels(service, call).inc()
+        raise
+    finally:
+        SERVICE_SECONDS.labels(service, call).observe(time.perf_counter() - start)
+        SERVICE_IN_FLIGHT.labels(service).dec()
+
+
+def add_tokens(prompt: int, completion: int):
+    LLM_TOKENS.labels("prompt").inc(prompt)
+    LLM_TOKENS.labels("completion").inc(completion)
+    _local.tokens = thread_tokens() + prompt + completion
+
+
+def thread_tokens() -> int:
+    """Tokens used so far by completions on this thread; diff two reads to attribute a call's usage."""
+    return getattr(_local, "tokens", 0)
+
+
+class JobProfile:
+    """cProfile stats of one job's stage calls in this process, merged across threads."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.stats = None
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile):
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+
+    def dump(self) -> str:
+        """Write the stats (open with pstats or snakeviz) and return the path, or None if nothing ran."""
+        with self._lock:
+            if self.stats is None:
+                return None
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"job-{self.job_id}-{socket.gethostname()}-{os.getpid()}.prof")
+            self.stats.dump_stats(path)
+            return path
+
+
+@contextmanager
+def profiled(profiles: set):
+    """Profile the body on this thread into each JobProfile (a batch may hold several jobs)."""
+    if not profiles:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active profiler per process; this call goes unprofiled
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        for profile in profiles:
+            profile.add(profiler)
+
+
+def metrics_response() -> tuple:
+    """(body, content type) for a /metrics response."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,334 @@
+"""
+Durable outbox for result emails.
+
+Screening writes a CandidateResult and its OutboundEmail row in one transaction,
+so a verdict is never lost because mail failed. OutboxSender drains the table
+on its own threads, retrying with exponential backoff, and records the final
+delivery state on CandidateResult.email_status.
+
+Run standalone with `python outbox.py` to send from a separate process.
+"""
+import datetime
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import or_
+
+from database import init_db, SessionLocal, OutboundEmail, CandidateResult, ScreeningBatch, ScreeningJob
+from email_sender import Notifier, GMAIL_BATCH_SIZE
+from email_templates import BatchTemplates
+
+# ---------- CONFIG ----------
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_CLAIM_SIZE = int(os.getenv("OUTBOX_CLAIM_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+# Rows stuck in SENDING longer than this (sender crashed mid-send) are retried
+OUTBOX_SENDING_TIMEOUT_SECONDS = int(os.getenv("OUTBOX_SENDING_TIMEOUT_SECONDS", "600"))
+# Custom SMTP rows are marked FAILED once the process holding their settings
+# hasn't renewed its heartbeat on the batch for this long
+OUTBOX_SMTP_CONFIG_WAIT_SECONDS = int(os.getenv("OUTBOX_SMTP_CONFIG_WAIT_SECONDS", "900"))
+OUTBOX_SMTP_HEARTBEAT_SECONDS = float(os.getenv("OUTBOX_SMTP_HEARTBEAT_SECONDS", "60"))
+
+# Custom SMTP credentials are never written to the DB. They live here until the
+# batch's job has finished and its emails are sent or failed, so SMTP rows are
+# only sent by the sender of the API process that received them. That process
+# is recorded on the batch (smtp_owner) and keeps smtp_heartbeat_at fresh.
+SENDER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+_smtp_configs = {}
+_MISSING_SMTP_CONFIG = (
+    "Custom SMTP settings are no longer available (the API process that received them stopped); "
+    "they are never stored, so resend from a new screening"
+)
+
+
+def register_smtp_config(batch_id: int, smtp_config: dict):
+    _smtp_configs[batch_id] = smtp_config
+
+
+def enqueue(db, result: CandidateResult, decision: str, use_own_smtp: bool = False) -> OutboundEmail:
+    """Add the result email for a CandidateResult to the outbox. The caller commits."""
+    email = OutboundEmail(
+        result_id=result.id,
+        batch_id=result.batch_id,
+        to_email=result.email,
+        decision=decision,
+        use_own_smtp=use_own_smtp,
+    )
+    db.add(email)
+    return email
+
+
+def _backoff(attempts: int) -> datetime.timedelta:
+    delay = min(3600, OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return datetime.timedelta(seconds=delay + random.uniform(0, OUTBOX_BACKOFF_SECONDS))
+
+
+class OutboxSender:
+    def __init__(self, workers: int = OUTBOX_WORKERS, poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.workers = max(1, workers)
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._templates = {}
+        # One Notifier per (batch, use_own_smtp) keeps its SMTP pool or Gmail clients across rounds
+        self._notifiers = {}
+        self._lock = threading.Lock()
+        self._heartbeat_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="outbox-sender", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def wake(self):
+        """Tell the sender new rows are waiting, instead of waiting for the next poll."""
+        self._wake.set()
+
+    def run_forever(self):
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="outbox") as executor:
+            while not self._stop.is_set():
+                self._wake.clear()
+                try:
+                    self._heartbeat()
+                except Exception as e:
+                    print(f"Outbox heartbeat error: {e}")
+                try:
+                    sent = self.run_once(executor)
+                except Exception as e:
+                    print(f"Outbox error: {e}")
+                    sent = 0
+                try:
+                    self._close_finished()
+                except Exception as e:
+                    print(f"Outbox cleanup error: {e}")
+                if not sent:
+                    self._wake.wait(self.poll_seconds)
+
+    def _claim(self) -> list:
+        """Mark due rows as SENDING and return their ids. Safe with several senders."""
+        db = SessionLocal()
+        try:
+            now = datetime.datetime.utcnow()
+            stuck = now - datetime.timedelta(seconds=OUTBOX_SENDING_TIMEOUT_SECONDS)
+            db.query(OutboundEmail).filter(
+                OutboundEmail.status == "SENDING",
+                OutboundEmail.updated_at < stuck
+            ).update({"status": "PENDING"}, synchronize_session=False)
+            db.commit()
+            self._fail_missing_smtp(db, now)
+
+            query = db.query(OutboundEmail.id, OutboundEmail.use_own_smtp, OutboundEmail.batch_id).filter(
+                OutboundEmail.status == "PENDING",
+                OutboundEmail.next_attempt_at <= now
+            ).order_by(OutboundEmail.id).limit(OUTBOX_CLAIM_SIZE)
+
+            claimed = []
+            for email_id, use_own_smtp, batch_id in query.all():
+                if use_own_smtp and batch_id not in _smtp_configs:
+                    continue
+                # Conditional update so two senders never claim the same row
+                updated = db.query(OutboundEmail).filter(
+                    OutboundEmail.id == email_id,
+                    OutboundEmail.status == "PENDING"
+                ).update({"status": "SENDING", "updated_at": now}, synchronize_session=False)
+                if updated:
+                    claimed.append(email_id)
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def _heartbeat(self):
+        """Tell other senders this process still holds the SMTP settings of its batches."""
+        if not _smtp_configs or time.monotonic() - self._heartbeat_at < OUTBOX_SMTP_HEARTBEAT_SECONDS:
+            return
+        db = SessionLocal()
+        try:
+            db.query(ScreeningBatch).filter(
+                ScreeningBatch.id.in_(list(_smtp_configs)),
+                ScreeningBatch.smtp_owner == SENDER_ID
+            ).update({"smtp_heartbeat_at": datetime.datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self._heartbeat_at = time.monotonic()
+
+    def _fail_missing_smtp(self, db, now: datetime.datetime):
+        """
+        Custom SMTP rows fail for good once the process holding their batch's
+        settings is gone, i.e. its heartbeat on the batch is stale or was never
+        written. Rows of a live process are left PENDING, however far behind it is.
+        """
+        stale = now - datetime.timedelta(seconds=OUTBOX_SMTP_CONFIG_WAIT_SECONDS)
+        rows = db.query(OutboundEmail.id, OutboundEmail.result_id).join(
+            ScreeningBatch, ScreeningBatch.id == OutboundEmail.batch_id
+        ).filter(
+            OutboundEmail.status == "PENDING",
+            OutboundEmail.use_own_smtp.is_(True),
+            OutboundEmail.batch_id.notin_(list(_smtp_configs)),
+            or_(ScreeningBatch.smtp_heartbeat_at.is_(None), ScreeningBatch.smtp_heartbeat_at < stale)
+        ).all()
+        if not rows:
+            return
+        db.query(OutboundEmail).filter(OutboundEmail.id.in_([r.id for r in rows])).update(
+            {"status": "FAILED", "last_error": _MISSING_SMTP_CONFIG}, synchronize_session=False
+        )
+        db.query(CandidateResult).filter(CandidateResult.id.in_([r.result_id for r in rows])).update(
+            {"email_status": "FAILED"}, synchronize_session=False
+        )
+        db.commit()
+        print(f"Outbox: {len(rows)} custom SMTP emails failed, the process holding their SMTP settings is gone")
+
+    def _notifier(self, batch_id: int, use_own_smtp: bool, templates: BatchTemplates) -> Notifier:
+        key = (batch_id, use_own_smtp)
+        with self._lock:
+            notifier = self._notifiers.get(key)
+            if notifier is None:
+                smtp_config = _smtp_configs.get(batch_id) if use_own_smtp else None
+                if use_own_smtp and smtp_config is None:
+                    raise RuntimeError(_MISSING_SMTP_CONFIG)
+                # One connection per sender thread, so a batch's chunks can go out in parallel
+                notifier = Notifier(templates.company_name, use_own_smtp, smtp_config, pool_size=self.workers)
+                self._notifiers[key] = notifier
+            return notifier
+
+    def _close_finished(self):
+        """
+        Close the notifiers and forget the SMTP settings of batches whose job
+        has finished and whose emails are all sent or failed.
+        """
+        with self._lock:
+            batch_ids = {batch_id for batch_id, _ in self._notifiers} | set(_smtp_configs)
+        if not batch_ids:
+            return
+        db = SessionLocal()
+        try:
+            busy = {
+                job_id for (job_id,) in db.query(ScreeningJob.id).filter(
+                    ScreeningJob.id.in_(batch_ids),
+                    ScreeningJob.status.notin_(("DONE", "FAILED"))
+                )
+            }
+            busy |= {
+                batch_id for (batch_id,) in db.query(OutboundEmail.batch_id).filter(
+                    OutboundEmail.batch_id.in_(batch_ids),
+                    OutboundEmail.status.in_(("PENDING", "SENDING"))
+                ).distinct()
+            }
+        finally:
+            db.close()
+        for batch_id in batch_ids - busy:
+            _smtp_configs.pop(batch_id, None)
+            with self._lock:
+                notifiers = [self._notifiers.pop((batch_id, own), None) for own in (False, True)]
+            for notifier in notifiers:
+                if notifier is not None:
+                    notifier.close()
+
+    def run_once(self, executor) -> int:
+        """Send one round of due emails. Returns how many rows were attempted."""
+        ids = self._claim()
+        if not ids:
+            return 0
+
+        db = SessionLocal()
+        try:
+            rows = db.query(OutboundEmail).filter(OutboundEmail.id.in_(ids)).all()
+            groups = defaultdict(list)
+            for row in rows:
+                groups[(row.batch_id, row.use_own_smtp)].append(
+                    {"id": row.id, "to": row.to_email, "decision": row.decision}
+                )
+            batches = {
+                b.id: b for b in db.query(ScreeningBatch).filter(ScreeningBatch.id.in_({k[0] for k in groups}))
+            }
+            templates = {}
+            for batch_id, b in batches.items():
+                if batch_id not in self._templates:
+                    self._templates[batch_id] = BatchTemplates(
+                        b.company_name, b.tagline, b.role_name, b.eligible_template, b.rejected_template
+                    )
+                templates[batch_id] = self._templates[batch_id]
+            # Templates are compiled once per batch; keep only recent batches
+            while len(self._templates) > 64:
+                self._templates.pop(next(iter(self._templates)))
+        finally:
+            db.close()
+
+        # Chunks of one batch go out in parallel over the batch's notifier
+        futures = [
+            executor.submit(self._send_group, batch_id, use_own_smtp, templates.get(batch_id), emails[i:i + GMAIL_BATCH_SIZE])
+            for (batch_id, use_own_smtp), emails in groups.items()
+            for i in range(0, len(emails), GMAIL_BATCH_SIZE)
+        ]
+        for future in futures:
+            future.result()
+        return len(ids)
+
+    def _send_group(self, batch_id: int, use_own_smtp: bool, templates: BatchTemplates, emails: list):
+        errors = []
+        start = time.perf_counter()
+        try:
+            if templates is None:
+                raise ValueError(f"Screening batch {batch_id} not found")
+            notifier = self._notifier(batch_id, use_own_smtp, templates)
+            messages = [(e["to"], templates.message(e["to"], e["decision"])) for e in emails]
+            errors = notifier.send_many(messages)
+        except Exception as e:
+            errors = [e] * len(emails)
+        self._record(emails, errors, (time.perf_counter() - start) / len(emails))
+
+    def _record(self, emails: list, errors: list, send_seconds: float):
+        db = SessionLocal()
+        try:
+            now = datetime.datetime.utcnow()
+            for e, error in zip(emails, errors):
+                row = db.get(OutboundEmail, e["id"])
+                row.attempts = (row.attempts or 0) + 1
+                row.send_seconds = round(send_seconds, 4)
+                if error is None:
+                    row.status = "SENT"
+                    row.last_error = None
+                elif row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    row.status = "FAILED"
+                    row.last_error = str(error)
+                else:
+                    row.status = "PENDING"
+                    row.last_error = str(error)
+                    row.next_attempt_at = now + _backoff(row.attempts)
+                if row.status in ("SENT", "FAILED"):
+                    db.query(CandidateResult).filter(CandidateResult.id == row.result_id).update(
+                        {"email_status": row.status}, synchronize_session=False
+                    )
+            db.commit()
+        finally:
+            db.close()
+
+
+outbox_sender = OutboxSender()
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Outbox sender running...")
+    try:
+        OutboxSender().run_forever()
+    except KeyboardInterrupt:
+        pass
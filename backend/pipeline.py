@@ -0,0 +1,165 @@
+import os
+import queue
+import threading
+import time
+
+from metrics import STAGE_SECONDS, STAGE_IN_FLIGHT, STAGE_ERRORS
+
+# ---------- CONFIG ----------
+# Worker count per stage
+DEFAULT_STAGE_WORKERS = {
+    "download": int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "8")),
+    "parse": int(os.getenv("PIPELINE_PARSE_WORKERS", "2")),
+    "evaluate": int(os.getenv("PIPELINE_EVALUATE_WORKERS", "4")),
+    # A single writer keeps one SQLAlchemy session on one thread
+    "persist": 1,
+}
+
+# Max items waiting between two stages (backpressure)
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+# How long a batching stage waits to fill a batch before running a partial one
+BATCH_WAIT_SECONDS = float(os.getenv("PIPELINE_BATCH_WAIT_SECONDS", "2"))
+
+_DONE = object()
+
+
+class Stage:
+    """
+    A pipeline step. With batch_size > 1, fn receives a list of up to batch_size
+    items and must return a list of the same length. None entries are dropped and
+    Exception entries are reported through on_error for that item only. A partial
+    batch runs once batch_wait seconds have passed since its first item arrived.
+    A batched stage always passes lists, so its batch_size can be raised while
+    the pipeline runs.
+    """
+
+    def __init__(self, name: str, fn, workers: int = 1, batch_size: int = 1, batch_wait: float = BATCH_WAIT_SECONDS,
+                 batched: bool = False):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = batch_wait
+        self.batched = batched or self.batch_size > 1
+
+
+def stage_workers() -> dict:
+    """Worker count per stage. The persist stage always runs with a single worker."""
+    return dict(DEFAULT_STAGE_WORKERS)
+
+
+def run_pipeline(items, stages: list, on_error, queue_size: int = QUEUE_SIZE):
+    """
+    Push items through the stages, each stage running its own worker threads.
+    Stages are connected by bounded queues, so a slow stage blocks the ones
+    before it instead of letting work pile up in memory.
+
+    Each stage fn receives an item and returns the item for the next stage,
+    or None to drop it. If a stage raises, on_error(item, stage_name, exc)
+    is called and the item goes no further. Items may finish out of order.
+    Stage call times, items in flight and errors are exported per stage name.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+
+    def next_batch(stage: Stage, inbox: queue.Queue):
+        """Collect up to batch_size items. Returns (items, done)."""
+        first = inbox.get()
+        if first is _DONE:
+            return [], True
+        items = [first]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(items) < stage.batch_size:
+            try:
+                item = inbox.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def call(stage: Stage, arg, count: int):
+        in_flight = STAGE_IN_FLIGHT.labels(stage.name)
+        in_flight.inc(count)
+        start = time.perf_counter()
+        try:
+            return stage.fn(arg)
+        except Exception:
+            STAGE_ERRORS.labels(stage.name).inc(count)
+            raise
+        finally:
+            STAGE_SECONDS.labels(stage.name).observe(time.perf_counter() - start)
+            in_flight.dec(count)
+
+    def report(item, stage: Stage, e: Exception):
+        # on_error may itself fail (e.g. a locked DB); the worker must live on to pass the stop signal
+        try:
+            on_error(item, stage.name, e)
+        except Exception as report_error:
+            print(f"Pipeline: on_error failed in {stage.name} ({report_error}) for: {e}")
+
+    def work(stage: Stage, inbox: queue.Queue, outbox):
+        done = False
+        while not done:
+            if stage.batched:
+                items, done = next_batch(stage, inbox)
+                if not items:
+                    break
+                try:
+                    results = call(stage, items, len(items))
+                except Exception as e:
+                    for item in items:
+                        report(item, stage, e)
+                    continue
+            else:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                items = [item]
+                try:
+                    results = [call(stage, item, 1)]
+                except Exception as e:
+                    report(item, stage, e)
+                    continue
+            for item, result in zip(items, results):
+                if isinstance(result, Exception):
+                    STAGE_ERRORS.labels(stage.name).inc()
+                    report(item, stage, result)
+                elif result is not None and outbox is not None:
+                    outbox.put(result)
+
+    def worker(index: int, remaining: list, lock: threading.Lock):
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        try:
+            work(stages[index], queues[index], outbox)
+        finally:
+            # Last worker out tells every worker of the next stage to stop
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and outbox is not None:
+                for _ in range(stages[index + 1].workers):
+                    outbox.put(_DONE)
+
+    threads = []
+    for index, stage in enumerate(stages):
+        remaining = [stage.workers]
+        lock = threading.Lock()
+        for n in range(stage.workers):
+            t = threading.Thread(
+                target=worker,
+                args=(index, remaining, lock),
+                name=f"{stage.name}-{n}",
+                daemon=True,
+            )
+            t.start()
+            threads.append(t)
+
+    try:
+        for item in items:
+            queues[0].put(item)
+    finally:
+        for _ in range(stages[0].workers):
+            queues[0].put(_DONE)
+        for t in threads:
+            t.join()
@@ -0,0 +1,148 @@
+"""
+Optional local pre-screen ahead of the model. Resumes are scored against the
+role's requirement keywords in batches; clear misses (and, if configured,
+clear matches) are decided locally and only the uncertain band between the
+two thresholds is sent to the model.
+
+The score is IDF-weighted keyword coverage: a resumes x requirement-terms
+term-frequency matrix is built once per batch, term frequencies are saturated
+(one mention counts 2/3 of many) and weighted by inverse document frequency
+over the job's resumes so far, so terms every resume contains count less.
+Terms no resume of the job has used yet carry no weight. Scores fall between
+0 (no requirement term) and 1.
+
+Every scored candidate's score is saved with its result. report() compares
+past scores with the model's verdicts, to pick thresholds before relying on them.
+"""
+import os
+import re
+import threading
+
+import numpy as np
+
+from database import CandidateResult, ScreeningBatch
+
+# ---------- CONFIG ----------
+# Scores below this are rejected locally; above PRESCREEN_ACCEPT_ABOVE accepted (1 = never)
+PRESCREEN_REJECT_BELOW = float(os.getenv("PRESCREEN_REJECT_BELOW", "0.1"))
+PRESCREEN_ACCEPT_ABOVE = float(os.getenv("PRESCREEN_ACCEPT_ABOVE", "1"))
+# Resumes scored per matrix (pipeline batch), and how long to wait to fill one
+PRESCREEN_BATCH_SIZE = int(os.getenv("PRESCREEN_BATCH_SIZE", "32"))
+PRESCREEN_BATCH_WAIT_SECONDS = float(os.getenv("PRESCREEN_BATCH_WAIT_SECONDS", "0.5"))
+
+# tf / (tf + k): one mention scores 0.67, three 0.86
+TF_SATURATION = 0.5
+REPORT_BANDS = 10
+
+_TOKEN = re.compile(r"[a-z][a-z0-9+#.]*[a-z0-9+#]|[a-z]")
+_STOPWORDS = {
+    "a", "an", "and", "or", "not", "the", "of", "in", "on", "for", "to", "with", "as", "at", "by",
+    "from", "is", "are", "be", "must", "should", "have", "has", "any", "etc", "e.g", "i.e",
+}
+_SUFFIXES = ("ations", "ation", "ings", "ing", "ers", "er", "ies", "es", "ed", "s")
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)]
+            # programming -> programm -> program
+            if word[-1] == word[-2]:
+                word = word[:-1]
+            break
+    return word
+
+
+def tokenize(text: str) -> list:
+    return [_stem(t) for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def requirement_terms(role_name: str, requirements: str) -> list:
+    """Distinct stemmed keywords of the role name and requirements, in order."""
+    return list(dict.fromkeys(tokenize(f"{role_name} {requirements}")))
+
+
+def decide(score, reject_below: float, accept_above: float):
+    """ELIGIBLE / NOT ELIGIBLE when the score is outside the uncertain band, else None."""
+    if score is None:
+        return None
+    if score < reject_below:
+        return "NOT ELIGIBLE"
+    if score > accept_above:
+        return "ELIGIBLE"
+    return None
+
+
+class Prescreener:
+    """Scores one job's resumes; document frequencies accumulate across its batches."""
+
+    def __init__(self, role_name: str, requirements: str):
+        self.terms = requirement_terms(role_name, requirements)
+        self._columns = {term: j for j, term in enumerate(self.terms)}
+        self._df = np.zeros(len(self.terms))
+        self._docs = 0
+        self._lock = threading.Lock()
+
+    def score(self, texts: list) -> list:
+        """One score per text, or None for every text while no requirement keyword has been seen."""
+        if not self.terms or not texts:
+            return [None] * len(texts)
+        tf = np.zeros((len(texts), len(self.terms)))
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                j = self._columns.get(token)
+                if j is not None:
+                    tf[i, j] += 1
+        with self._lock:
+            self._df += np.count_nonzero(tf, axis=0)
+            self._docs += len(texts)
+            weights = (np.log((1 + self._docs) / (1 + self._df)) + 1) * (self._df > 0)
+        if not weights.any():
+            return [None] * len(texts)
+        coverage = (tf / (tf + TF_SATURATION)) @ weights / weights.sum()
+        return [round(float(s), 4) for s in coverage]
+
+
+def report(db, user_id: int, reject_below: float = PRESCREEN_REJECT_BELOW, accept_above: float = PRESCREEN_ACCEPT_ABOVE) -> dict:
+    """
+    How pre-screen scores relate to the model's verdicts on the user's past
+    batches (candidates that were scored and then sent to the model), and what
+    the given thresholds would have decided locally.
+    """
+    rows = db.query(CandidateResult.prescreen_score, CandidateResult.status).join(
+        ScreeningBatch, ScreeningBatch.id == CandidateResult.batch_id
+    ).filter(
+        ScreeningBatch.user_id == user_id,
+        CandidateResult.decided_by == "model",
+        CandidateResult.prescreen_score.isnot(None)
+    ).all()
+    scores = np.array([score for score, _ in rows], dtype=float)
+    eligible = np.array([status == "ELIGIBLE" for _, status in rows], dtype=bool)
+
+    bands = []
+    edges = np.linspace(0, 1, REPORT_BANDS + 1)
+    for low, high in zip(edges[:-1], edges[1:]):
+        in_band = (scores >= low) & ((scores < high) | (high == 1))
+        bands.append({
+            "from": round(float(low), 2), "to": round(float(high), 2),
+            "candidates": int(in_band.sum()), "eligible": int((in_band & eligible).sum())
+        })
+
+    rejected = scores < reject_below
+    accepted = scores > accept_above
+    correlation = None
+    if len(rows) > 1 and scores.std() > 0 and eligible.std() > 0:
+        correlation = round(float(np.corrcoef(scores, eligible)[0, 1]), 3)
+    return {
+        "candidates": len(rows),
+        # Point-biserial correlation between score and an ELIGIBLE verdict
+        "correlation": correlation,
+        "bands": bands,
+        "reject_below": reject_below,
+        "accept_above": accept_above,
+        "would_reject": int(rejected.sum()),
+        "would_reject_agreeing": int((rejected & ~eligible).sum()),
+        "would_accept": int(accepted.sum()),
+        "would_accept_agreeing": int((accepted & eligible).sum()),
+        "model_calls_saved_share": round(float((rejected | accepted).mean()), 3) if len(rows) else 0.0,
+    }
@@ -0,0 +1,50 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+    acquire() blocks until enough tokens are available; pause() stops all
+    callers until a deadline (used when the API sends Retry-After).
+    A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1):
+        if self.rate <= 0:
+            return
+        # A single request bigger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = max(self._paused_until - now, (amount - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def adjust(self, delta: float):
+        """Give back (positive) or charge (negative) tokens once the real cost is known."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + delta)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
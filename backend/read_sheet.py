@@ -1,27 +1,30 @@
-from googleapiclient.discovery import build
 import pandas as pd
 
 # ✅ Shared Google auth (env-based, Render-safe)
-from google_auth import get_credentials, SCOPES_SHEETS_DRIVE
+from google_auth import get_service
 
 # ---------- CONFIG ----------
 SPREADSHEET_ID = "1rC-88voXWtwb102CSdu6k3y-OCJxk1YMJNJuHUkpYpA"
 
-# ---------- AUTH ----------
-creds = get_credentials(SCOPES_SHEETS_DRIVE)
-service = build("sheets", "v4", credentials=creds)
 
 # ---------- READ SHEET ----------
-sheet = service.spreadsheets()
-result = sheet.values().get(
-    spreadsheetId=SPREADSHEET_ID,
-    range="Form Responses 1"
-).execute()
+def read_responses(spreadsheet_id: str = SPREADSHEET_ID):
+    """All form responses as a DataFrame, or None when the sheet has no data rows."""
+    service = get_service("sheets", "v4")
+    result = service.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id,
+        range="Form Responses 1"
+    ).execute()
 
-values = result.get("values", [])
+    values = result.get("values", [])
+    if len(values) < 2:
+        return None
+    return pd.DataFrame(values[1:], columns=values[0])
 
-if len(values) < 2:
-    print("No data found in sheet")
-else:
-    df = pd.DataFrame(values[1:], columns=values[0])
-    print(df["resume"])
+
+if __name__ == "__main__":
+    df = read_responses()
+    if df is None:
+        print("No data found in sheet")
+    else:
+        print(df["resume"])
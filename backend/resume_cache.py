@@ -0,0 +1,90 @@
+import datetime
+import os
+import threading
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, ResumeText
+
+# ---------- CONFIG ----------
+# Total extracted text kept in the cache before least-recently-used entries are evicted
+RESUME_CACHE_MAX_BYTES = int(os.getenv("RESUME_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+RESUME_CACHE_ENABLED = os.getenv("RESUME_CACHE_ENABLED", "1") == "1"
+
+
+def file_revision(meta: dict):
+    """
+    Return a string that changes whenever the Drive file content changes.
+    Binary uploads have an md5Checksum; native Google files only have modifiedTime.
+    """
+    return meta.get("md5Checksum") or meta.get("modifiedTime")
+
+
+class ResumeTextCache:
+    """
+    Persistent cache of extracted resume text, shared by all jobs through the DB.
+    One instance per job so hit/miss counts can be reported in the job log.
+    Safe to use from several pipeline threads (each call opens its own session).
+    """
+
+    def __init__(self, enabled: bool = RESUME_CACHE_ENABLED, max_bytes: int = RESUME_CACHE_MAX_BYTES):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, file_id: str, revision: str):
+        if not self.enabled or not revision:
+            return None
+        db = SessionLocal()
+        try:
+            entry = db.query(ResumeText).filter(
+                ResumeText.file_id == file_id,
+                ResumeText.revision == revision
+            ).first()
+            text = None
+            if entry is not None:
+                text = entry.text
+                entry.last_used = datetime.datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def put(self, file_id: str, revision: str, text: str):
+        if not self.enabled or not revision:
+            return
+        db = SessionLocal()
+        try:
+            db.add(ResumeText(file_id=file_id, revision=revision, text=text, size=len(text.encode("utf-8"))))
+            db.commit()
+            self._evict(db)
+        except IntegrityError:
+            # Another worker cached the same revision first
+            db.rollback()
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        total = db.query(func.coalesce(func.sum(ResumeText.size), 0)).scalar()
+        if total <= self.max_bytes:
+            return
+        stale_ids = []
+        for entry_id, size in db.query(ResumeText.id, ResumeText.size).order_by(ResumeText.last_used.asc()):
+            if total <= self.max_bytes:
+                break
+            stale_ids.append(entry_id)
+            total -= size or 0
+        db.query(ResumeText).filter(ResumeText.id.in_(stale_ids)).delete(synchronize_session=False)
+        db.commit()
+
+    def summary(self) -> str:
+        return f"Resume cache: {self.hits} hits, {self.misses} misses"
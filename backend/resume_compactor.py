@@ -0,0 +1,146 @@
+import os
+import re
+import threading
+from collections import Counter
+
+# ---------- CONFIG ----------
+# Approximate prompt budget for one resume (0 = no truncation)
+RESUME_TOKEN_BUDGET = int(os.getenv("RESUME_TOKEN_BUDGET", "1500"))
+
+# Roughly 4 characters per token for English text
+CHARS_PER_TOKEN = 4
+
+# Pages of extracted text are separated by form feeds (see resume_reader._read_pdf)
+PAGE_BREAK = "\f"
+# Lines at the top and bottom of a page checked for running headers/footers
+_EDGE_LINES = 3
+
+# "Page 2", "Page 2 of 3", "2 of 3", "2/3"; a bare "2" or "- 2 -" only as a page's first or last line
+_PAGE_NUMBER = re.compile(r"^(page\s*\d+(\s*(of|/)\s*\d+)?|\d+\s*(of|/)\s*\d+)$", re.IGNORECASE)
+_BARE_PAGE_NUMBER = re.compile(r"^[-–]?\s*\d{1,3}\s*[-–]?$")
+_BOILERPLATE = [
+    re.compile(r"^(curriculum vitae|resume|résumé|cv)$", re.IGNORECASE),
+    re.compile(r"references? (are )?(available )?(up)?on request", re.IGNORECASE),
+    re.compile(r"^i hereby declare", re.IGNORECASE),
+    re.compile(r"^declaration:?$", re.IGNORECASE),
+    re.compile(r"true to the best of my knowledge", re.IGNORECASE),
+    # "Date: 01/02/2024" or a bare "Signature" line, not "Signature Bank intern"
+    re.compile(r"^(place|date|signature)\s*(:.{0,30})?$", re.IGNORECASE),
+]
+_HEADING = re.compile(r"^[A-Z][A-Za-z &/]{2,40}:?$")
+_WORD = re.compile(r"[a-z][a-z0-9+#.]{2,}")
+_STOPWORDS = {
+    "and", "the", "for", "with", "from", "that", "this", "have", "has", "are", "was",
+    "will", "skills", "experience", "years", "year", "education", "or", "not",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _page_lines(page: str) -> list:
+    lines = [re.sub(r"\s+", " ", line).strip() for line in page.splitlines()]
+    return [line for line in lines if line]
+
+
+def _running_lines(pages: list) -> tuple:
+    """
+    Short lines in the top or bottom lines of most pages: running headers and
+    footers like the name, email or "Confidential". Returns (headers, footers).
+    """
+    if len(pages) < 2:
+        return set(), set()
+    tops, bottoms = Counter(), Counter()
+    for lines in pages:
+        tops.update({line for line in lines[:_EDGE_LINES] if len(line) < 80})
+        bottoms.update({line for line in lines[-_EDGE_LINES:] if len(line) < 80})
+    return (
+        {line for line, n in tops.items() if n * 2 > len(pages)},
+        {line for line, n in bottoms.items() if n * 2 > len(pages)},
+    )
+
+
+def _clean_lines(text: str) -> list:
+    """Normalize whitespace and drop page numbers, boilerplate and running headers/footers."""
+    pages = [_page_lines(page) for page in text.split(PAGE_BREAK)]
+    headers, footers = _running_lines(pages)
+    seen = set()
+    cleaned = []
+    for lines in pages:
+        last = len(lines) - 1
+        for i, line in enumerate(lines):
+            if _PAGE_NUMBER.match(line) or (i in (0, last) and _BARE_PAGE_NUMBER.match(line)):
+                continue
+            if any(p.search(line) for p in _BOILERPLATE):
+                continue
+            # A running header or footer is kept once, where it first appears
+            if (i < _EDGE_LINES and line in headers) or (i > last - _EDGE_LINES and line in footers):
+                if line in seen:
+                    continue
+                seen.add(line)
+            cleaned.append(line)
+    return cleaned
+
+
+def _split_sections(lines: list) -> list:
+    """Group lines under headings like "EXPERIENCE" or "Projects:"."""
+    sections = [[]]
+    for line in lines:
+        is_heading = len(line) <= 40 and (line.isupper() or line.endswith(":") or _HEADING.match(line) and line.istitle())
+        if is_heading and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    return ["\n".join(s) for s in sections if s]
+
+
+def _keywords(text: str) -> set:
+    return {w.strip(".") for w in _WORD.findall(text.lower())} - _STOPWORDS
+
+
+def compact_resume(text: str, requirements: str = "", token_budget: int = RESUME_TOKEN_BUDGET) -> str:
+    """
+    Shrink resume text before it goes into a prompt. If it is still over the token
+    budget, the first section (name/contact/summary) is always kept and the rest
+    are kept in order of overlap with the requirements, in their original order.
+    """
+    compacted = "\n".join(_clean_lines(text or ""))
+    if not token_budget or estimate_tokens(compacted) <= token_budget:
+        return compacted
+
+    sections = _split_sections(compacted.splitlines())
+    wanted = _keywords(requirements)
+    budget = token_budget * CHARS_PER_TOKEN
+
+    ranked = sorted(
+        range(1, len(sections)),
+        key=lambda i: -len(_keywords(sections[i]) & wanted)
+    )
+    keep = {}
+    used = 0
+    for i in [0] + ranked:
+        if used >= budget:
+            break
+        piece = sections[i][:budget - used]
+        keep[i] = piece
+        used += len(piece) + 1
+    return "\n".join(keep[i] for i in sorted(keep))
+
+
+class CompactionStats:
+    """Per-job totals of tokens before and after compaction."""
+
+    def __init__(self):
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def add(self, before: str, after: str):
+        with self._lock:
+            self.tokens_before += estimate_tokens(before)
+            self.tokens_after += estimate_tokens(after)
+
+    def summary(self) -> str:
+        saved = self.tokens_before - self.tokens_after
+        percent = int(saved / self.tokens_before * 100) if self.tokens_before else 0
+        return f"Resume compaction: ~{self.tokens_before} -> ~{self.tokens_after} tokens ({percent}% saved)"
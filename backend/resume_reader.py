@@ -1,26 +1,233 @@
 import pdfplumber
+import pypdfium2 as pdfium
 from docx import Document
+import io
+import multiprocessing
 import os
+import signal
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 
-def extract_text(file_path):
-    ext = os.path.splitext(file_path)[1].lower()
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+GOOGLE_DOC_MIME = "application/vnd.google-apps.document"
 
-    if ext == ".pdf":
-        return extract_pdf(file_path)
-    elif ext == ".docx":
-        return extract_docx(file_path)
+# ---------- CONFIG ----------
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "2"))
+PARSE_TIMEOUT_SECONDS = int(os.getenv("PARSE_TIMEOUT_SECONDS", "20"))
+PARSE_MAX_PAGES = int(os.getenv("PARSE_MAX_PAGES", "10"))
+# Stop reading a resume once this much text was extracted (0 = no limit)
+PARSE_MAX_CHARS = int(os.getenv("PARSE_MAX_CHARS", "30000"))
+# Preferred PDF backend; the others are tried in order if it fails
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pdfium")
+
+
+class ParseError(Exception):
+    """A resume could not be parsed (corrupt file, timeout or crashed worker)."""
+
+
+def _kind(source, mime_type: str = None) -> str:
+    if mime_type:
+        return {PDF_MIME: ".pdf", DOCX_MIME: ".docx", GOOGLE_DOC_MIME: ".docx"}.get(mime_type, "")
+    return os.path.splitext(source)[1].lower()
+
+def extract_text(source, mime_type: str = None, max_pages: int = None, max_chars: int = None):
+    """
+    Extract text from a file path or a binary file-like object.
+    The parser is picked from mime_type when given (e.g. from Drive),
+    otherwise from the file extension. Other file types raise ParseError.
+    """
+    kind = _kind(source, mime_type)
+
+    if kind == ".pdf":
+        return extract_pdf(source, max_pages, max_chars)
+    elif kind == ".docx":
+        return extract_docx(source)
     else:
-        return ""
-
-def extract_pdf(file_path):
-    text = ""
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    return text
-
-def extract_docx(file_path):
-    doc = Document(file_path)
+        raise ParseError(f"unsupported file type {mime_type or kind or source}")
+
+
+# ---------- PDF BACKENDS ----------
+class PdfExtractor:
+    """A PDF text backend: yields the plain text of each page, in order."""
+    name = ""
+
+    def pages(self, source, max_pages: int = None):
+        raise NotImplementedError
+
+
+class PdfiumExtractor(PdfExtractor):
+    """PDFium text layer without layout analysis. Much faster, plain reading order."""
+    name = "pdfium"
+
+    def pages(self, source, max_pages: int = None):
+        pdf = pdfium.PdfDocument(source)
+        try:
+            for i in range(min(len(pdf), max_pages or len(pdf))):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                try:
+                    yield textpage.get_text_range().replace("\r\n", "\n")
+                finally:
+                    textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+
+
+class PdfplumberExtractor(PdfExtractor):
+    """pdfminer layout analysis through pdfplumber. Slower, better on odd layouts."""
+    name = "pdfplumber"
+
+    def pages(self, source, max_pages: int = None):
+        with pdfplumber.open(source) as pdf:
+            for page in pdf.pages[:max_pages]:
+                yield page.extract_text() or ""
+
+
+PDF_EXTRACTORS = {e.name: e for e in (PdfiumExtractor(), PdfplumberExtractor())}
+
+def _read_pdf(extractor: PdfExtractor, source, max_pages: int = None, max_chars: int = None):
+    """Return (text, pages_read)."""
+    parts = []
+    size = 0
+    pages_read = 0
+    for page_text in extractor.pages(source, max_pages):
+        pages_read += 1
+        if page_text:
+            parts.append(page_text)
+            size += len(page_text) + 1
+        if max_chars and size >= max_chars:
+            # Enough text to screen on, skip the remaining pages
+            break
+    # Form feeds keep the page boundaries for header/footer detection in resume_compactor
+    text = "\f".join(parts) + "\n" if parts else ""
+    return (text[:max_chars] if max_chars else text), pages_read
+
+def extract_pdf(source, max_pages: int = None, max_chars: int = None, backend: str = None):
+    """
+    Extract PDF text with the preferred backend, falling back to the others
+    if it raises. File-like sources are rewound before each attempt. A parse
+    timeout is final: the next backend would run without a time limit.
+    """
+    preferred = backend or PDF_EXTRACTOR
+    order = [preferred] + [name for name in PDF_EXTRACTORS if name != preferred]
+    error = None
+    for name in order:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        try:
+            return _read_pdf(PDF_EXTRACTORS[name], source, max_pages, max_chars)[0]
+        except (TimeoutError, ParseError):
+            raise
+        except Exception as e:
+            error = e
+            if backend:
+                break
+    raise error
+
+def extract_docx(source):
+    doc = Document(source)
     return "\n".join(p.text for p in doc.paragraphs)
+
+
+# ---------- PROCESS POOL ----------
+def _timeout_handler(signum, frame):
+    raise TimeoutError("parse timed out")
+
+def _extract_in_worker(data: bytes, kind: str, max_pages: int, max_chars: int, timeout: int):
+    # Runs in a pool process; SIGALRM interrupts a pathological file without killing the worker
+    signal.signal(signal.SIGALRM, _timeout_handler)
+    signal.alarm(timeout)
+    try:
+        if kind == ".pdf":
+            return extract_pdf(io.BytesIO(data), max_pages, max_chars)
+        return extract_docx(io.BytesIO(data))
+    finally:
+        signal.alarm(0)
+
+
+class ExtractorPool:
+    """
+    Runs PDF/DOCX parsing in worker processes so CPU-heavy files don't hold the GIL
+    of the API process. Each file gets a hard timeout and a page cap. If a worker
+    hangs past the timeout or dies, the pool is replaced and ParseError is raised.
+    Other files that were running or queued in the replaced pool are submitted
+    once more to the new one, so a bad file doesn't fail other candidates.
+    """
+
+    def __init__(self, processes: int = PARSE_PROCESSES, timeout: int = PARSE_TIMEOUT_SECONDS,
+                 max_pages: int = PARSE_MAX_PAGES, max_chars: int = PARSE_MAX_CHARS):
+        self.processes = max(1, processes)
+        self.timeout = timeout
+        self.max_pages = max_pages or None
+        self.max_chars = max_chars or None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Forking a threaded server process is unsafe, so start clean interpreters
+                self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _reset(self, pool):
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def extract_text(self, source, mime_type: str = None) -> str:
+        kind = _kind(source, mime_type)
+        if kind not in (".pdf", ".docx"):
+            # Not an empty resume: the candidate is recorded as PARSE_ERROR rather than rejected
+            raise ParseError(f"unsupported file type {mime_type or kind or source}")
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                data = f.read()
+        else:
+            data = source.read()
+
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                future = pool.submit(_extract_in_worker, data, kind, self.max_pages, self.max_chars, self.timeout)
+            except RuntimeError:
+                # Broken or shut down by another thread's reset since we got it
+                self._reset(pool)
+                continue
+            try:
+                # Small grace period over the in-worker alarm before giving up on the process
+                return future.result(timeout=self.timeout + 5)
+            except FutureTimeout:
+                self._reset(pool)
+                raise ParseError(f"parse timed out after {self.timeout}s")
+            except (BrokenProcessPool, CancelledError):
+                # This file crashed the worker, or shared the pool with one that hung or crashed
+                self._reset(pool)
+            except Exception as e:
+                raise ParseError(str(e) or type(e).__name__)
+        raise ParseError("parser process crashed")
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+def get_extractor_pool() -> ExtractorPool:
+    """Process-wide pool, started on first use and reused by every job."""
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = ExtractorPool()
+        return _extractor
@@ -0,0 +1,525 @@
+"""
+Screening logic for one job, run by queue workers (see worker.py): reading the
+response sheet into work items, and the download -> parse -> evaluate -> persist
+steps for each candidate.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload
+from pydantic import BaseModel
+
+from services import google_service
+from resume_reader import get_extractor_pool, ParseError, GOOGLE_DOC_MIME, DOCX_MIME
+from ai_evaluator import check_resumes_batch, MODEL
+from outbox import enqueue
+from calendar_invite import schedule_interview
+from jobs import Job
+from job_queue import (
+    add_work_items, complete_work_item, finish_job, item_counts, first_failed_row, screened_rows,
+    duplicate_items, save_job_stats, stats_summary, WORK_ITEM_MAX_ATTEMPTS,
+)
+from resume_cache import ResumeTextCache, file_revision
+from verdict_cache import VerdictCache, verdict_key
+from resume_compactor import CompactionStats, compact_resume, RESUME_TOKEN_BUDGET
+from sheet_reader import SheetReader, find_columns
+from sheet_sync import get_watermark, save_watermark, is_screened, row_screened, record_submission
+from database import SessionLocal, ScreeningJob, CandidateResult
+from metrics import track_call, thread_tokens, DOWNLOADED_BYTES, CANDIDATES, DEDUP, PRESCREEN, JobProfile
+from prescreen import Prescreener, decide, PRESCREEN_REJECT_BELOW, PRESCREEN_ACCEPT_ABOVE
+from dedup import DuplicateIndex, criteria_scope, minhash, DEDUP_ENABLED
+
+# ---------- REQUEST MODEL ----------
+class SheetRequest(BaseModel):
+    sheet_link: str
+    company_name: str = "DUDE TECH"
+    tagline: str = "Building smart hiring systems"
+    role_name: str = "Software Engineer"
+    role_requirements: str = "Programming skills AND CS/IT education"
+    use_own_smtp: bool = False
+    smtp_config: dict = None
+    # Ignore memoized verdicts and ask the model again
+    force_reevaluate: bool = False
+    # Resumes evaluated per LLM request (1 = one request per candidate); workers size their
+    # evaluate stage to the largest value among the jobs they screen
+    eval_batch_size: int = int(os.getenv("EVAL_BATCH_SIZE", "1"))
+    # Approximate tokens of resume text sent to the model (0 = no limit)
+    resume_token_budget: int = RESUME_TOKEN_BUDGET
+    # Optional custom email HTML with $company_name, $tagline, $role_name and $meet_link placeholders
+    eligible_template: str = None
+    rejected_template: str = None
+    # Only screen responses added since the last run of this sheet, skipping files already screened
+    incremental: bool = False
+    # Save a cProfile of this job's stage calls under PROFILE_DIR
+    profile: bool = False
+    # Score resumes locally and only send those between the thresholds to the model.
+    # With reject_below 0 and accept_above 1 every candidate is scored but none decided locally.
+    prescreen: bool = False
+    prescreen_reject_below: float = PRESCREEN_REJECT_BELOW
+    prescreen_accept_above: float = PRESCREEN_ACCEPT_ABOVE
+    # Collapse repeated submissions (same email and file) and reuse the verdict of near-identical
+    # resumes screened earlier under the same criteria (unless force_reevaluate)
+    dedup: bool = DEDUP_ENABLED
+
+# ---------- HELPERS ----------
+def extract_sheet_id(link: str):
+    return link.split("/d/")[1].split("/")[0]
+
+class ResumeLinkError(ValueError):
+    """The resume cell isn't a Google Drive file link."""
+
+def extract_file_id(link: str):
+    if "id=" in link:
+        return link.split("id=")[1]
+    if "/d/" in link:
+        return link.split("/d/")[1].split("/")[0]
+    raise ResumeLinkError(f"Not a Google Drive file link: {link}")
+
+def is_permanent_error(e: Exception) -> bool:
+    """
+    Failures a later run of the same row would hit again: a malformed link, a
+    deleted or unshared file (403/404 that isn't a rate limit) or an unreadable one.
+    """
+    if isinstance(e, (ParseError, ResumeLinkError)):
+        return True
+    if isinstance(e, HttpError) and e.resp.status in (403, 404):
+        return b"ratelimitexceeded" not in (e.content or b"").lower()
+    return False
+
+def submission_key(email: str, resume_link: str) -> tuple:
+    """Same applicant and same Drive file, however the email is cased or the link written."""
+    try:
+        file_id = extract_file_id(resume_link)
+    except ResumeLinkError:
+        file_id = resume_link
+    return email.strip().lower(), file_id.strip()
+
+# Downloads stay in memory up to this size, larger files spill to a private temp file
+RESUME_SPOOL_MAX_BYTES = int(os.getenv("RESUME_SPOOL_MAX_BYTES", str(10 * 1024 * 1024)))
+
+def get_file_metadata(drive_service, file_id: str) -> dict:
+    with track_call("drive", "files.get"):
+        return drive_service.files().get(
+            fileId=file_id,
+            fields="mimeType,md5Checksum,modifiedTime,size"
+        ).execute()
+
+def download_resume(drive_service, file_id: str, mime_type: str):
+    """
+    Stream a Drive file into a rewound file object (BytesIO-like).
+    Native Google Docs are exported as .docx.
+    """
+    if mime_type == GOOGLE_DOC_MIME:
+        request = drive_service.files().export_media(fileId=file_id, mimeType=DOCX_MIME)
+    else:
+        request = drive_service.files().get_media(fileId=file_id)
+    fh = tempfile.SpooledTemporaryFile(max_size=RESUME_SPOOL_MAX_BYTES)
+    with track_call("drive", "download"):
+        downloader = MediaIoBaseDownload(fh, request)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+    DOWNLOADED_BYTES.inc(fh.tell())
+    fh.seek(0)
+    return fh
+
+def _mark_item(item_id: int, result: str, error: str = None, stats: dict = None, permanent: bool = False):
+    CANDIDATES.labels(result).inc()
+    db = SessionLocal()
+    try:
+        complete_work_item(db, item_id, result, error, stats, permanent=permanent)
+        db.commit()
+    finally:
+        db.close()
+
+def persist_results(db, items: list):
+    """
+    Write screened candidates (from any jobs) in one transaction: results, their
+    outbox emails, the dedup index and work item completion. Marking the item
+    done in the same commit means nobody is emailed twice if a worker dies.
+    """
+    start = time.perf_counter()
+    rows = []
+    for c in items:
+        if "decision" not in c:
+            # Kept on the item, so a retried write doesn't book a second meeting
+            c["decision"] = f"ELIGIBLE\nMeet: {schedule_interview()}" if c["status"] == "ELIGIBLE" else "NOT ELIGIBLE"
+        result = CandidateResult(
+            batch_id=c["run"].id, email=c["email"], status=c["status"], email_status="PENDING",
+            decided_by=c.get("decided_by", "model"), prescreen_score=c.get("prescreen_score"),
+            duplicate_of=c.get("duplicate_of"), dedup_kind=c.get("dedup_kind"), dedup_similarity=c.get("dedup_similarity")
+        )
+        db.add(result)
+        rows.append((c, result))
+    db.flush()
+    fingerprints = {}
+    for c, result in rows:
+        run = c["run"]
+        enqueue(db, result, c["decision"], use_own_smtp=run.req.use_own_smtp)
+        record_submission(db, run.user_id, run.sheet_id, c["email"], c["file_id"], c["revision"], result.id, c["row"])
+        # Only the model's own verdicts are offered to later near-duplicates
+        if c.get("minhash") is not None and result.decided_by == "model":
+            fingerprints.setdefault(run, []).append((result.id, c["status"], c["minhash"]))
+    for run, entries in fingerprints.items():
+        run.duplicates.add(db, entries)
+    # The item's own row is written in this transaction, so its persist time stops short of the commit
+    elapsed = round(time.perf_counter() - start, 4)
+    for c, result in rows:
+        c["stats"]["persist"] = elapsed
+        complete_work_item(db, c["id"], c["status"], stats=c["stats"], result_id=result.id)
+    db.commit()
+    for c, _ in rows:
+        CANDIDATES.labels(c["status"]).inc()
+
+# ---------- SCREENING RUN ----------
+class ScreeningRun:
+    """
+    What a worker keeps for one job while it screens the job's items: the
+    request, the event writer and per-job caches. Several workers may each
+    hold a run for the same job; progress is shared through the work items.
+    """
+
+    def __init__(self, job_id: int, user_id: int, req: SheetRequest):
+        self.id = job_id
+        self.user_id = user_id
+        self.req = req
+        self.sheet_id = extract_sheet_id(req.sheet_link)
+        self.job = Job(job_id, user_id)
+        self.log = self.job.log
+        self.text_cache = ResumeTextCache()
+        self.verdicts = VerdictCache()
+        self.compaction = CompactionStats()
+        self.extractor = get_extractor_pool()
+        self.profile = JobProfile(job_id) if req.profile else None
+        self.prescreener = Prescreener(req.role_name, req.role_requirements) if req.prescreen else None
+        self.prescreened = {"ELIGIBLE": 0, "NOT ELIGIBLE": 0, "model": 0}
+        self.duplicates = DuplicateIndex(criteria_scope(user_id, req.role_name, req.role_requirements, MODEL)) if req.dedup else None
+        self.screened = 0
+        self._summarized = False
+        # Progress is based on finished candidates, since workers complete out of order
+        self._done = 0
+        self._total = 1
+        self._lock = threading.Lock()
+
+    def refresh(self, db):
+        """Sync the progress counters with what all workers have finished."""
+        job = db.get(ScreeningJob, self.id)
+        counts = item_counts(db, self.id)
+        with self._lock:
+            self._done = sum(n for key, n in counts.items() if key != "open")
+            self._total = max(1, job.total_rows or 0)
+
+    def progress(self, finish: bool = False) -> int:
+        with self._lock:
+            if finish:
+                self._done += 1
+            return min(99, int((self._done / self._total) * 100))
+
+    # ---------- SHEET ----------
+    def read_sheet(self, db, job: ScreeningJob, stop):
+        """
+        Turn the sheet's response rows into work items, a chunk at a time, so
+        workers can start on the first chunk. Resumes after job.rows_read when
+        a previous reader stopped part way.
+        """
+        log = self.log
+        first_read = not job.total_rows
+        if first_read:
+            log("Initializing services...")
+        try:
+            sheets_service = google_service("sheets", "v4")
+        except Exception as e:
+            log(f"CRITICAL ERROR: Failed to load Google Credentials: {e}")
+            self.job.flush()
+            finish_job(db, job.id, "FAILED")
+            return
+
+        reader = SheetReader(sheets_service, self.sheet_id)
+        headers = reader.read_header()
+        if not headers:
+            log("No responses found in Google Sheet")
+            log("All resumes processed")
+            self.job.flush()
+            finish_job(db, job.id)
+            return
+
+        email_idx, resume_idx = find_columns(headers)
+        if email_idx == -1 or resume_idx == -1:
+            log(f"Error: Columns not found. Headers: {headers}")
+            self.job.flush()
+            finish_job(db, job.id, "FAILED")
+            return
+
+        if first_read:
+            log(f"Started screening for {self.req.role_name} at {self.req.company_name}")
+            # Data rows already handled by earlier runs (row 1 of the sheet is the header)
+            job.start_row = get_watermark(db, self.user_id, self.sheet_id) if self.req.incremental else 0
+            job.rows_read = job.start_row
+            if job.start_row:
+                log(f"Incremental sync: skipping {job.start_row} rows screened in earlier runs")
+            # The sheet's grid size stands in for the row count until the last chunk is read
+            row_count = reader.row_count()
+            job.total_rows = max(1, row_count - job.start_row)
+            db.commit()
+        else:
+            row_count = None
+            log(f"Resuming sheet read after row {job.rows_read}")
+
+        rows_read = job.rows_read
+        # First row of each (email, file) pair; later rows are collapsed into it
+        seen = {}
+        if self.req.dedup and not first_read:
+            for i, email, resume_link in screened_rows(db, job.id):
+                seen.setdefault(submission_key(email, resume_link), i)
+        collapsed = 0
+        try:
+            # Only the email and resume columns are read, a chunk of rows at a time
+            for chunk in reader.chunks(email_idx, resume_idx, rows_read, row_count):
+                rows = []
+                duplicates = {}
+                for i, email, resume_link in chunk:
+                    if not email or not resume_link:
+                        log(f"Skipping empty row {i}")
+                        continue
+                    rows.append((i, email, resume_link))
+                    if self.req.dedup:
+                        first = seen.setdefault(submission_key(email, resume_link), i)
+                        if first != i:
+                            duplicates[i] = first
+                rows_read = chunk[-1][0]
+                add_work_items(db, job.id, rows, rows_read, duplicates)
+                collapsed += len(duplicates)
+                DEDUP.labels("submission").inc(len(duplicates))
+                if stop():
+                    return
+        except Exception as e:
+            # Never mark a partly read sheet as expanded, the job would finish DONE
+            # without the remaining rows. The worker fails the job and logs this.
+            raise RuntimeError(f"Stopped reading the sheet after row {rows_read}: {e}") from e
+
+        items = sum(item_counts(db, job.id).values())
+        job = db.get(ScreeningJob, job.id)
+        job.total_rows = items
+        job.expanded = True
+        db.commit()
+        if not items:
+            log("No new responses found in Google Sheet" if job.start_row else "No responses found in Google Sheet")
+        if collapsed:
+            log(f"Collapsed {collapsed} repeated submissions (same email and resume file)")
+
+    # ---------- STAGES ----------
+    def download(self, c):
+        log = self.log
+        if c["attempts"] > WORK_ITEM_MAX_ATTEMPTS:
+            raise RuntimeError(f"Gave up after {WORK_ITEM_MAX_ATTEMPTS} attempts")
+        log(f"[{self.progress()}%] Processing {c['email']}")
+        c["file_id"] = extract_file_id(c["resume_link"])
+        # Rows re-read behind a held-back watermark: no Drive call for the ones already screened
+        if self.req.incremental and row_screened(self.user_id, self.sheet_id, c["row"], c["email"], c["file_id"]):
+            return self._skip_screened(c)
+        # Per-thread client (httplib2 is not thread-safe), built once per worker thread
+        drive = google_service("drive", "v3")
+        meta = get_file_metadata(drive, c["file_id"])
+        c["mime_type"] = meta.get("mimeType")
+        c["revision"] = file_revision(meta)
+        if self.req.incremental and is_screened(self.user_id, self.sheet_id, c["email"], c["file_id"], c["revision"]):
+            return self._skip_screened(c)
+        cached = self.text_cache.get(c["file_id"], c["revision"])
+        if cached is not None:
+            # Same file revision was parsed before, skip download and parse
+            c["resume_text"] = cached
+            return c
+        c["resume_file"] = download_resume(drive, c["file_id"], c["mime_type"])
+        c["stats"]["bytes"] = c["resume_file"].seek(0, os.SEEK_END)
+        c["resume_file"].seek(0)
+        return c
+
+    def _skip_screened(self, c):
+        _mark_item(c["id"], "SKIPPED", stats=c["stats"])
+        self.log(f"[{self.progress(finish=True)}%] Skipping {c['email']}, this resume was already screened")
+        return None
+
+    def parse(self, c):
+        if "resume_text" not in c:
+            start = time.perf_counter()
+            try:
+                c["resume_text"] = self.extractor.extract_text(c["resume_file"], c["mime_type"])
+                c["stats"]["extract"] = round(time.perf_counter() - start, 4)
+            finally:
+                c.pop("resume_file").close()
+            self.text_cache.put(c["file_id"], c["revision"], c["resume_text"])
+
+        if self.duplicates is not None:
+            # Fingerprint the full text, compaction depends on the requirements
+            c["minhash"] = minhash(c["resume_text"])
+        compacted = compact_resume(c["resume_text"], self.req.role_requirements, self.req.resume_token_budget)
+        self.compaction.add(c["resume_text"], compacted)
+        c["resume_text"] = compacted
+        return c
+
+    def dedup(self, batch: list) -> list:
+        """Candidates whose resume nearly matches one screened earlier take over its verdict."""
+        if self.duplicates is None or self.req.force_reevaluate:
+            return batch
+        for c, match in zip(batch, self.duplicates.find([c.get("minhash") for c in batch])):
+            if match is None:
+                continue
+            c["duplicate_of"], c["status"], c["dedup_similarity"] = match
+            c["decided_by"] = "dedup"
+            c["dedup_kind"] = "resume"
+            DEDUP.labels("resume").inc()
+        return batch
+
+    def prescreen(self, batch: list) -> list:
+        """Score a batch locally; candidates outside the uncertain band get their status here."""
+        if self.prescreener is None:
+            return batch
+        req = self.req
+        # Candidates already decided by dedup keep that verdict
+        pending = [c for c in batch if "decided_by" not in c]
+        for c, score in zip(pending, self.prescreener.score([c["resume_text"] for c in pending])):
+            c["prescreen_score"] = score
+            decision = decide(score, req.prescreen_reject_below, req.prescreen_accept_above)
+            if decision:
+                c["status"] = decision
+                c["decided_by"] = "prescreen"
+            outcome = decision or "model"
+            PRESCREEN.labels(outcome).inc()
+            with self._lock:
+                self.prescreened[outcome] += 1
+        return batch
+
+    def evaluate(self, batch: list) -> list:
+        req = self.req
+        pending = []
+        for c in batch:
+            if "decided_by" in c:
+                continue
+            self.log(f"[{self.progress()}%] Analyzing {c['email']}...")
+            c["verdict_key"] = verdict_key(c["resume_text"], req.role_name, req.role_requirements, MODEL)
+            c["decision"] = None if req.force_reevaluate else self.verdicts.get(c["verdict_key"])
+            if c["decision"] is None:
+                pending.append(c)
+
+        size = max(1, req.eval_batch_size)
+        for start in range(0, len(pending), size):
+            chunk = pending[start:start + size]
+            tokens = thread_tokens()
+            decisions = check_resumes_batch([c["resume_text"] for c in chunk], req.role_name, req.role_requirements)
+            # A batched completion's usage is split evenly between its candidates
+            tokens = round((thread_tokens() - tokens) / len(chunk))
+            for c, decision in zip(chunk, decisions):
+                c["decision"] = decision
+                c["stats"]["tokens"] = tokens
+                if not isinstance(decision, Exception):
+                    self.verdicts.put(c["verdict_key"], decision)
+
+        results = []
+        for c in batch:
+            # The text is no longer needed, don't keep it queued in memory
+            del c["resume_text"]
+            if c.get("decided_by") == "prescreen":
+                self.log(f"[{self.progress()}%] {c['status']} for {c['email']} by pre-screen (score {c['prescreen_score']:.2f})")
+                results.append(c)
+                continue
+            if c.get("decided_by") == "dedup":
+                self.log(f"[{self.progress()}%] {c['status']} for {c['email']}, resume {c['dedup_similarity']:.0%} "
+                         f"similar to an earlier candidate's")
+                results.append(c)
+                continue
+            decision = c.pop("decision")
+            if isinstance(decision, Exception):
+                results.append(decision)
+                continue
+            c["status"] = "ELIGIBLE" if decision.startswith("ELIGIBLE") else "NOT ELIGIBLE"
+            results.append(c)
+        return results
+
+    def persisted(self, c):
+        """Report a candidate whose result was committed by persist_results()."""
+        self.screened += 1
+        self.log(f"[{self.progress(finish=True)}%] Queued result email to {c['email']}")
+        self.job.add_result(c["email"], c["status"])
+
+    def on_error(self, c, stage, e):
+        if "resume_file" in c: c.pop("resume_file").close()
+        status = "PARSE_ERROR" if isinstance(e, ParseError) else "ERROR"
+        permanent = is_permanent_error(e) or c["attempts"] > WORK_ITEM_MAX_ATTEMPTS
+        _mark_item(c["id"], status, str(e) or status, c.get("stats"), permanent)
+        self.log(f"[{self.progress(finish=True)}%] {status} for {c['email']}: {str(e)}")
+        self.job.add_result(c["email"], status)
+
+    # ---------- FINISH ----------
+    def summarize(self):
+        """Cache and compaction totals for the part of the job this worker screened."""
+        if self._summarized:
+            return
+        self._summarized = True
+        # Each cache counts only when enabled, so each summary stands on its own
+        if self.text_cache.hits or self.text_cache.misses:
+            self.log(self.text_cache.summary())
+        if self.verdicts.hits or self.verdicts.misses:
+            self.log(self.verdicts.summary())
+        if self.compaction.tokens_before:
+            self.log(self.compaction.summary())
+        self.verdicts.evict()
+        if self.duplicates is not None:
+            if self.duplicates.hits:
+                self.log(self.duplicates.summary())
+            self.duplicates.evict()
+        if self.prescreener is not None and sum(self.prescreened.values()):
+            local = self.prescreened["ELIGIBLE"] + self.prescreened["NOT ELIGIBLE"]
+            calls = -(-local // max(1, self.req.eval_batch_size))
+            self.log(
+                f"Pre-screen: {self.prescreened['NOT ELIGIBLE']} rejected and {self.prescreened['ELIGIBLE']} accepted locally, "
+                f"{self.prescreened['model']} sent to the model (~{calls} model calls saved)"
+            )
+        if self.profile is not None:
+            path = self.profile.dump()
+            if path:
+                self.log(f"Profile saved to {path}")
+
+    def record_duplicates(self, db):
+        """
+        Give collapsed submissions a result copied from the row they repeat, for
+        the audit trail. No email is sent for them. The caller commits.
+        """
+        rows = duplicate_items(db, self.id)
+        results = []
+        for item, result_id, status in rows:
+            # The first submission failed or was skipped: the item's DUPLICATE result is all there is
+            if result_id is None:
+                continue
+            result = CandidateResult(
+                batch_id=self.id, email=item.email, status=status, email_status="SKIPPED",
+                decided_by="dedup", duplicate_of=result_id, dedup_kind="submission"
+            )
+            db.add(result)
+            results.append((item, result))
+        db.flush()
+        for item, result in results:
+            item.result_id = result.id
+
+    def finish(self, db):
+        """Wrap up a job whose items are all done (called by the worker that claimed it)."""
+        self.record_duplicates(db)
+        job = db.get(ScreeningJob, self.id)
+        # Next incremental run starts at the first row that may pass on a retry;
+        # rows that failed for good (dead links, unreadable files) don't hold it back
+        failed_row = first_failed_row(db, self.id)
+        save_watermark(db, self.user_id, self.sheet_id, failed_row - 1 if failed_row else job.rows_read)
+        if self.req.incremental:
+            skipped = item_counts(db, self.id).get("SKIPPED", 0)
+            self.log(f"Incremental sync: {skipped} already screened resumes skipped")
+        self.summarize()
+        stats = save_job_stats(db, self.id)
+        # Commit before logging: the event writer uses its own session
+        db.commit()
+        if stats["candidates"]:
+            self.log(stats_summary(stats))
+        self.log("100% - All resumes processed")
+        self.job.flush()
+        finish_job(db, self.id)
@@ -0,0 +1,84 @@
+"""
+Clients for the external services screening talks to: Google Sheets and
+Drive, Gmail, Groq and SMTP. By default these are the real clients, built on
+first use. install() swaps in other factories (see fakes.py), so the pipeline
+can run locally and be benchmarked without any credentials.
+"""
+import smtplib
+import ssl
+import threading
+
+_overrides = {}
+_lock = threading.Lock()
+_groq = None
+
+
+def install(google=None, gmail=None, groq=None, smtp=None):
+    """
+    Replace service factories for this process:
+      google(name, version) -> discovery-style Sheets/Drive client
+      gmail() -> discovery-style Gmail client
+      groq() -> client with chat.completions.create()
+      smtp(host, port, user, password) -> logged-in smtplib.SMTP-like connection
+    """
+    global _groq
+    with _lock:
+        for name, factory in (("google", google), ("gmail", gmail), ("groq", groq), ("smtp", smtp)):
+            if factory is not None:
+                _overrides[name] = factory
+        _groq = None
+
+
+def reset():
+    """Go back to the real clients."""
+    global _groq
+    with _lock:
+        _overrides.clear()
+        _groq = None
+
+
+def google_service(name: str, version: str):
+    """Sheets or Drive client for the calling thread (see google_auth.get_service)."""
+    factory = _overrides.get("google")
+    if factory is not None:
+        return factory(name, version)
+    from google_auth import get_service
+    return get_service(name, version)
+
+
+def gmail_service():
+    factory = _overrides.get("gmail")
+    if factory is not None:
+        return factory()
+    from gmail_client import get_gmail_service
+    return get_gmail_service()
+
+
+def groq_client():
+    """Groq client shared by all threads. The API key is only required once a model is called."""
+    global _groq
+    with _lock:
+        if _groq is None:
+            factory = _overrides.get("groq")
+            if factory is not None:
+                _groq = factory()
+            else:
+                from ai_evaluator import build_client
+                _groq = build_client()
+        return _groq
+
+
+def smtp_connection(host: str, port: int, user: str, password: str):
+    factory = _overrides.get("smtp")
+    if factory is not None:
+        return factory(host, port, user, password)
+    context = ssl.create_default_context()
+    # Port 465 is typically for implicit SSL
+    if port == 465:
+        server = smtplib.SMTP_SSL(host, port, context=context)
+    else:
+        # Ports like 25, 587 are for STARTTLS
+        server = smtplib.SMTP(host, port)
+        server.starttls(context=context)
+    server.login(user, password)
+    return server
@@ -0,0 +1,103 @@
+"""
+Streams candidate rows from a form response sheet in fixed-size chunks.
+
+The header row is read once to find the email and resume columns, then only
+those two columns are fetched, a chunk of rows per request, so screening can
+start on the first chunk while the rest of the sheet is still being read.
+"""
+import os
+
+from metrics import track_call
+
+# ---------- CONFIG ----------
+SHEET_NAME = "Form Responses 1"
+SHEET_CHUNK_ROWS = int(os.getenv("SHEET_CHUNK_ROWS", "1000"))
+# Retries of a Sheets request on 5xx, 429 and rate limit errors, with the client's exponential backoff
+SHEET_READ_RETRIES = int(os.getenv("SHEET_READ_RETRIES", "5"))
+
+
+def column_letter(index: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA"""
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def find_columns(headers: list) -> tuple:
+    """(email_idx, resume_idx) from the header row, -1 when a column is missing."""
+    email_idx = -1
+    resume_idx = -1
+    for i, h in enumerate(h.lower().strip() for h in headers):
+        if "email" in h: email_idx = i
+        if "resume" in h or "upload" in h or "cv" in h: resume_idx = i
+    return email_idx, resume_idx
+
+
+class SheetReader:
+    def __init__(self, sheets_service, sheet_id: str, sheet_name: str = SHEET_NAME, chunk_rows: int = SHEET_CHUNK_ROWS):
+        self.values = sheets_service.spreadsheets().values()
+        self.spreadsheets = sheets_service.spreadsheets()
+        self.sheet_id = sheet_id
+        self.sheet_name = sheet_name
+        self.chunk_rows = max(1, chunk_rows)
+
+    def _range(self, a1: str) -> str:
+        return f"'{self.sheet_name}'!{a1}"
+
+    def read_header(self) -> list:
+        with track_call("sheets", "values.get"):
+            result = self.values.get(spreadsheetId=self.sheet_id, range=self._range("1:1")).execute(num_retries=SHEET_READ_RETRIES)
+        rows = result.get("values", [])
+        return rows[0] if rows else []
+
+    def row_count(self) -> int:
+        """Data rows in the sheet grid, an upper bound used for progress before the last chunk arrives."""
+        with track_call("sheets", "spreadsheets.get"):
+            result = self.spreadsheets.get(
+                spreadsheetId=self.sheet_id,
+                ranges=[self.sheet_name],
+                fields="sheets.properties.gridProperties.rowCount"
+            ).execute(num_retries=SHEET_READ_RETRIES)
+        sheets = result.get("sheets", [])
+        if not sheets:
+            return 0
+        return max(0, sheets[0]["properties"]["gridProperties"].get("rowCount", 0) - 1)
+
+    def chunks(self, email_idx: int, resume_idx: int, start_row: int = 0, row_count: int = None):
+        """
+        Yield lists of (row, email, resume_link) for data rows after start_row
+        (row 1 is the first response), up to row_count data rows (the grid size
+        when not given). Blank cells come back as "".
+        """
+        email_col = column_letter(email_idx)
+        resume_col = column_letter(resume_idx)
+        if row_count is None:
+            row_count = self.row_count()
+        first = start_row + 2  # sheet row of the first data row to read
+        # The grid size bounds the read: the API trims trailing blank cells of
+        # each range, so a short chunk may just end in cleared rows
+        while first <= row_count + 1:
+            last = first + self.chunk_rows - 1
+            with track_call("sheets", "values.batchGet"):
+                result = self.values.batchGet(
+                    spreadsheetId=self.sheet_id,
+                    ranges=[
+                        self._range(f"{email_col}{first}:{email_col}{last}"),
+                        self._range(f"{resume_col}{first}:{resume_col}{last}"),
+                    ],
+                    majorDimension="COLUMNS"
+                ).execute(num_retries=SHEET_READ_RETRIES)
+            columns = [(r.get("values") or [[]])[0] for r in result.get("valueRanges", [])]
+            emails, links = (columns + [[], []])[:2]
+            count = max(len(emails), len(links))
+            if count:
+                emails = emails + [""] * (count - len(emails))
+                links = links + [""] * (count - len(links))
+                yield [
+                    (first - 1 + i, emails[i].strip(), links[i].strip())
+                    for i in range(count)
+                ]
+            first = last + 1
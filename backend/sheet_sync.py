@@ -0,0 +1,87 @@
+"""
+Incremental screening of a response sheet: a per-sheet high-water mark of rows
+already handled, plus a dedup index of (email, resume file revision) pairs so a
+candidate who submits the same file again isn't screened or emailed twice.
+"""
+from database import SessionLocal, SheetSyncState, ScreenedSubmission
+
+
+def get_watermark(db, user_id: int, sheet_id: str) -> int:
+    """Number of data rows (below the header) already handled for this sheet."""
+    state = db.query(SheetSyncState).filter(
+        SheetSyncState.user_id == user_id,
+        SheetSyncState.sheet_id == sheet_id
+    ).first()
+    return state.rows_processed if state else 0
+
+
+def save_watermark(db, user_id: int, sheet_id: str, rows_processed: int):
+    state = db.query(SheetSyncState).filter(
+        SheetSyncState.user_id == user_id,
+        SheetSyncState.sheet_id == sheet_id
+    ).first()
+    if state is None:
+        state = SheetSyncState(user_id=user_id, sheet_id=sheet_id)
+        db.add(state)
+    state.rows_processed = rows_processed
+    db.commit()
+
+
+def is_screened(user_id: int, sheet_id: str, email: str, file_id: str, revision: str) -> bool:
+    """Safe to call from pipeline worker threads (opens its own session)."""
+    db = SessionLocal()
+    try:
+        return db.query(ScreenedSubmission.id).filter(
+            ScreenedSubmission.user_id == user_id,
+            ScreenedSubmission.sheet_id == sheet_id,
+            ScreenedSubmission.email == email,
+            ScreenedSubmission.file_id == file_id,
+            ScreenedSubmission.revision == revision
+        ).first() is not None
+    finally:
+        db.close()
+
+
+def row_screened(user_id: int, sheet_id: str, row: int, email: str, file_id: str) -> bool:
+    """
+    Whether this sheet row itself was screened, at any revision of the file.
+    Rows re-read behind a held-back watermark are skipped this way without a
+    Drive metadata call. Opens its own session like is_screened().
+    """
+    db = SessionLocal()
+    try:
+        return db.query(ScreenedSubmission.id).filter(
+            ScreenedSubmission.user_id == user_id,
+            ScreenedSubmission.sheet_id == sheet_id,
+            ScreenedSubmission.email == email,
+            ScreenedSubmission.file_id == file_id,
+            ScreenedSubmission.row == row
+        ).first() is not None
+    finally:
+        db.close()
+
+
+def record_submission(db, user_id: int, sheet_id: str, email: str, file_id: str, revision: str, result_id: int,
+                      row: int = None):
+    """Add to the dedup index in the caller's transaction (the caller commits)."""
+    existing = db.query(ScreenedSubmission).filter(
+        ScreenedSubmission.user_id == user_id,
+        ScreenedSubmission.sheet_id == sheet_id,
+        ScreenedSubmission.email == email,
+        ScreenedSubmission.file_id == file_id,
+        ScreenedSubmission.revision == revision
+    ).first()
+    if existing is not None:
+        # Re-screened in a full run, point the index at the latest result
+        existing.result_id = result_id
+        existing.row = row
+        return
+    db.add(ScreenedSubmission(
+        user_id=user_id,
+        sheet_id=sheet_id,
+        email=email,
+        file_id=file_id,
+        revision=revision,
+        row=row,
+        result_id=result_id,
+    ))
@@ -0,0 +1,98 @@
+"""
+Batched evaluation against a stubbed Groq client: verdicts map back to the
+right candidates, and candidates the batched answer leaves out or contradicts
+fall back to single calls.
+
+    cd backend && python -m pytest -q test_ai_evaluator.py
+"""
+import os
+from types import SimpleNamespace
+
+# No rate limiting against the stub
+os.environ.setdefault("GROQ_RPM", "0")
+os.environ.setdefault("GROQ_TPM", "0")
+
+import pytest
+
+import services
+from ai_evaluator import check_resumes_batch, parse_batch_verdicts
+
+
+class StubGroq:
+    """Answers batched prompts with a scripted reply and single prompts from the resume text."""
+
+    def __init__(self, batch_reply=None, batch_error=None, single_error_for=None):
+        self.batch_reply = batch_reply
+        self.batch_error = batch_error
+        self.single_error_for = single_error_for
+        self.batch_calls = 0
+        self.single_calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, temperature, max_tokens):
+        prompt = messages[-1]["content"]
+        if "=== CANDIDATE" in prompt:
+            self.batch_calls += 1
+            if self.batch_error:
+                raise self.batch_error
+            content = self.batch_reply
+        else:
+            resume = prompt.split("Resume:\n", 1)[1].strip()
+            self.single_calls.append(resume)
+            if resume == self.single_error_for:
+                raise ValueError("single call failed")
+            content = "ELIGIBLE" if "python" in resume else "NOT ELIGIBLE"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+@pytest.fixture
+def groq():
+    def install(**kwargs):
+        stub = StubGroq(**kwargs)
+        services.install(groq=lambda: stub)
+        return stub
+    yield install
+    services.reset()
+
+
+RESUMES = ["alice: python, cs degree", "bob: sales", "carol: python, it degree"]
+
+
+def test_parse_batch_verdicts_maps_numbers_to_candidates():
+    content = "Here are the results:\n2: NOT ELIGIBLE\nCandidate #1) eligible\n3. ELIGIBLE"
+    assert parse_batch_verdicts(content, 3) == {0: "ELIGIBLE", 1: "NOT ELIGIBLE", 2: "ELIGIBLE"}
+
+
+def test_parse_batch_verdicts_drops_out_of_range_and_conflicting_lines():
+    content = "0: ELIGIBLE\n4: ELIGIBLE\n1: ELIGIBLE\n1: NOT ELIGIBLE\n2: NOT ELIGIBLE"
+    assert parse_batch_verdicts(content, 3) == {1: "NOT ELIGIBLE"}
+
+
+def test_batch_verdicts_follow_candidate_order(groq):
+    stub = groq(batch_reply="3: ELIGIBLE\n1: ELIGIBLE\n2: NOT ELIGIBLE")
+    assert check_resumes_batch(RESUMES) == ["ELIGIBLE", "NOT ELIGIBLE", "ELIGIBLE"]
+    assert stub.batch_calls == 1
+    assert stub.single_calls == []
+
+
+def test_missing_and_conflicting_candidates_fall_back_to_single_calls(groq):
+    # 2 is missing, 3 contradicts itself; the batched "ELIGIBLE" for 1 is kept
+    stub = groq(batch_reply="1: ELIGIBLE\n3: ELIGIBLE\n3: NOT ELIGIBLE")
+    assert check_resumes_batch(RESUMES) == ["ELIGIBLE", "NOT ELIGIBLE", "ELIGIBLE"]
+    assert stub.single_calls == [RESUMES[1], RESUMES[2]]
+
+
+def test_failed_batch_call_falls_back_for_every_candidate(groq):
+    stub = groq(batch_error=ValueError("bad request"), single_error_for=RESUMES[1])
+    decisions = check_resumes_batch(RESUMES)
+    assert decisions[0] == "ELIGIBLE"
+    # A failed single call is returned in its candidate's slot, the others are unaffected
+    assert isinstance(decisions[1], ValueError)
+    assert decisions[2] == "ELIGIBLE"
+    assert stub.single_calls == RESUMES
+
+
+def test_single_resume_skips_the_batched_prompt(groq):
+    stub = groq(batch_reply="1: NOT ELIGIBLE")
+    assert check_resumes_batch(RESUMES[:1]) == ["ELIGIBLE"]
+    assert stub.batch_calls == 0
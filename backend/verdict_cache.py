@@ -0,0 +1,93 @@
+import datetime
+import hashlib
+import os
+import re
+import threading
+
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, Verdict
+
+# ---------- CONFIG ----------
+VERDICT_CACHE_ENABLED = os.getenv("VERDICT_CACHE_ENABLED", "1") == "1"
+VERDICT_CACHE_TTL_SECONDS = int(os.getenv("VERDICT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "100000"))
+
+
+def verdict_key(resume_text: str, role_name: str, requirements: str, model: str) -> str:
+    """
+    Hash of everything that determines a temperature=0 completion.
+    Whitespace differences in the resume text don't change the key.
+    """
+    normalized = re.sub(r"\s+", " ", resume_text or "").strip()
+    payload = "\x1f".join([model, role_name.strip(), requirements.strip(), normalized])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    Durable memo of LLM verdicts in the DB, with TTL and size-based eviction.
+    One instance per job so hit/miss counts can be reported in the job log.
+    """
+
+    def __init__(self, enabled: bool = VERDICT_CACHE_ENABLED, ttl_seconds: int = VERDICT_CACHE_TTL_SECONDS,
+                 max_entries: int = VERDICT_CACHE_MAX_ENTRIES):
+        self.enabled = enabled
+        self.ttl = datetime.timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+        db = SessionLocal()
+        try:
+            entry = db.query(Verdict).filter(Verdict.key == key).first()
+            decision = None
+            if entry is not None and entry.created_at >= datetime.datetime.utcnow() - self.ttl:
+                decision = entry.decision
+        finally:
+            db.close()
+
+        with self._lock:
+            if decision is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return decision
+
+    def put(self, key: str, decision: str):
+        """Store a verdict, replacing any expired entry with the same key."""
+        if not self.enabled:
+            return
+        db = SessionLocal()
+        try:
+            db.query(Verdict).filter(Verdict.key == key).delete(synchronize_session=False)
+            db.add(Verdict(key=key, decision=decision))
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same verdict first
+            db.rollback()
+        finally:
+            db.close()
+
+    def evict(self):
+        """Drop expired verdicts, then the oldest ones beyond max_entries. Called once per job."""
+        if not self.enabled:
+            return
+        db = SessionLocal()
+        try:
+            cutoff = datetime.datetime.utcnow() - self.ttl
+            db.query(Verdict).filter(Verdict.created_at < cutoff).delete(synchronize_session=False)
+            overflow = db.query(Verdict).count() - self.max_entries
+            if overflow > 0:
+                oldest = db.query(Verdict.id).order_by(Verdict.created_at.asc()).limit(overflow)
+                db.query(Verdict).filter(Verdict.id.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def summary(self) -> str:
+        return f"Verdict cache: {self.hits} hits, {self.misses} misses"
@@ -0,0 +1,333 @@
+"""
+Screening worker. Reads queued jobs' sheets into work items and screens leased
+items through the stage pipeline. Any number of workers (processes or hosts)
+can run against the same DB; the API process runs one too unless
+JOB_WORKER_IN_PROCESS=0.
+
+    python worker.py
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from database import init_db, SessionLocal, ScreeningJob
+from jobs import Job, purge_finished_jobs
+from job_queue import (
+    claim_job_to_read, claim_work_items, claim_finished_jobs, renew_leases,
+    release_job_leases, finish_job, WORKER_LEASE_SECONDS,
+)
+from pipeline import Stage, run_pipeline, stage_workers
+from outbox import outbox_sender
+from screening import ScreeningRun, SheetRequest, persist_results
+from metrics import profiled, WORKER_METRICS_PORT
+from prescreen import PRESCREEN_BATCH_SIZE, PRESCREEN_BATCH_WAIT_SECONDS
+from dedup import DEDUP_BATCH_SIZE, DEDUP_BATCH_WAIT_SECONDS
+
+# ---------- CONFIG ----------
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "2"))
+# Results are committed in batches of up to this many, or after this long
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "50"))
+PERSIST_FLUSH_SECONDS = float(os.getenv("PERSIST_FLUSH_SECONDS", "1"))
+PURGE_INTERVAL_SECONDS = 600
+
+
+def _profiles(batch: list) -> set:
+    return {c["run"].profile for c in batch if c["run"].profile is not None}
+
+
+def _timed(stage: str, fn, batch: bool = False):
+    """
+    Wrap a stage fn to record its duration in each candidate's stats (a batch
+    call counts fully for every candidate in it) and profile it when asked.
+    """
+    def run(arg):
+        items = arg if batch else [arg]
+        start = time.perf_counter()
+        try:
+            with profiled(_profiles(items)):
+                return fn(arg)
+        finally:
+            elapsed = round(time.perf_counter() - start, 4)
+            for c in items:
+                c["stats"][stage] = elapsed
+    return run
+
+
+class JobWorker:
+    def __init__(self, poll_seconds: float = WORKER_POLL_SECONDS):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.poll_seconds = poll_seconds
+        self._runs = {}
+        self._runs_lock = threading.Lock()
+        self._reading = threading.Event()
+        self._wake_reader = threading.Event()
+        self._wake_screener = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for name, target in (("reader", self._read_loop), ("screener", self._screen_loop), ("heartbeat", self._heartbeat_loop)):
+            t = threading.Thread(target=target, name=f"job-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        self.wake()
+        for t in self._threads:
+            t.join(timeout=60)
+        self._threads = []
+        with self._runs_lock:
+            runs = list(self._runs.values())
+        for run in runs:
+            run.job.flush()
+        # Items still leased finish their lease; sheet reads are handed over now
+        release_job_leases(self.worker_id)
+
+    def wake(self):
+        """Tell the worker a job was queued, instead of waiting for the next poll."""
+        self._wake_reader.set()
+        self._wake_screener.set()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self._stop.is_set():
+                time.sleep(1)
+        finally:
+            self.stop()
+
+    def _run(self, job_id: int, db=None):
+        """The ScreeningRun this worker keeps for a job, loaded on first use."""
+        with self._runs_lock:
+            run = self._runs.get(job_id)
+        if run is not None:
+            return run
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            job = db.get(ScreeningJob, job_id)
+            if job is None:
+                return None
+            run = ScreeningRun(job.id, job.user_id, SheetRequest(**json.loads(job.request)))
+        finally:
+            if own_session:
+                db.close()
+        with self._runs_lock:
+            return self._runs.setdefault(job_id, run)
+
+    # ---------- SHEET READER ----------
+    def _read_loop(self):
+        while not self._stop.is_set():
+            self._wake_reader.clear()
+            try:
+                job_id = claim_job_to_read(self.worker_id)
+            except Exception as e:
+                print(f"Job reader error: {e}")
+                job_id = None
+            if job_id is None:
+                self._wake_reader.wait(self.poll_seconds)
+                continue
+
+            self._reading.set()
+            db = SessionLocal()
+            try:
+                run = self._run(job_id, db)
+                run.read_sheet(db, db.get(ScreeningJob, job_id), self._stop.is_set)
+                run.job.flush()
+            except Exception as e:
+                self._fail(db, job_id, e)
+            finally:
+                db.close()
+                self._reading.clear()
+                self._wake_screener.set()
+
+    def _fail(self, db, job_id: int, e: Exception):
+        db.rollback()
+        job = Job(job_id, None)
+        job.log(f"FATAL ERROR: {e}")
+        job.flush()
+        finish_job(db, job_id, "FAILED")
+
+    # ---------- SCREENER ----------
+    def _screen_loop(self):
+        last_purge = 0
+        while not self._stop.is_set():
+            self._wake_screener.clear()
+            try:
+                screened = self._screen()
+                self._finish_jobs()
+                self._drop_finished_runs()
+                if time.monotonic() - last_purge > PURGE_INTERVAL_SECONDS:
+                    purge_finished_jobs()
+                    last_purge = time.monotonic()
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                screened = 0
+            if not screened:
+                self._wake_screener.wait(self.poll_seconds)
+
+    def _claimed_items(self, count: list, evaluate: Stage):
+        """
+        Lease items until the queue runs dry (waiting while a sheet is still being read).
+        The evaluate stage grows to the largest eval_batch_size of the jobs seen.
+        """
+        while not self._stop.is_set():
+            items = claim_work_items(self.worker_id)
+            if not items:
+                if self._reading.is_set():
+                    self._wake_screener.wait(0.5)
+                    self._wake_screener.clear()
+                    continue
+                return
+            db = SessionLocal()
+            try:
+                runs = {}
+                for c in items:
+                    if c["job_id"] not in runs:
+                        runs[c["job_id"]] = self._run(c["job_id"], db)
+                        if runs[c["job_id"]] is not None:
+                            runs[c["job_id"]].refresh(db)
+                            evaluate.batch_size = max(evaluate.batch_size, runs[c["job_id"]].req.eval_batch_size)
+            finally:
+                db.close()
+            for c in items:
+                c["run"] = runs[c["job_id"]]
+                if c["run"] is not None:
+                    count[0] += 1
+                    yield c
+
+    def _screen(self) -> int:
+        """Run one pipeline over leased items from any job. Returns how many were screened."""
+        count = [0]
+        # Single persist thread, owns this session
+        db = SessionLocal()
+
+        def by_run(method):
+            # A stage batch may mix jobs; each job handles its own candidates
+            def run_batch(batch):
+                groups = {}
+                for c in batch:
+                    groups.setdefault(c["run"], []).append(c)
+                results = {}
+                for run, group in groups.items():
+                    for c, result in zip(group, getattr(run, method)(group)):
+                        results[id(c)] = result
+                return [results[id(c)] for c in batch]
+            return run_batch
+
+        def persist(batch):
+            # One commit per batch; if it fails, retry one by one so only the bad item errors
+            try:
+                with profiled(_profiles(batch)):
+                    persist_results(db, batch)
+                errors = [None] * len(batch)
+            except Exception:
+                db.rollback()
+                errors = []
+                for c in batch:
+                    try:
+                        persist_results(db, [c])
+                        errors.append(None)
+                    except Exception as e:
+                        db.rollback()
+                        errors.append(e)
+            for c, error in zip(batch, errors):
+                if error is None:
+                    c["run"].persisted(c)
+            outbox_sender.wake()
+            return errors
+
+        def on_error(c, stage, e):
+            if stage == "persist":
+                db.rollback()
+            c["run"].on_error(c, stage, e)
+
+        workers = stage_workers()
+        # Each job batches its own candidates by its eval_batch_size; jobs with 1 get single calls
+        evaluate = Stage("evaluate", _timed("evaluate", by_run("evaluate"), batch=True), workers["evaluate"], batched=True)
+        try:
+            run_pipeline(self._claimed_items(count, evaluate), [
+                Stage("download", _timed("download", lambda c: c["run"].download(c)), workers["download"]),
+                Stage("parse", _timed("parse", lambda c: c["run"].parse(c)), workers["parse"]),
+                # Jobs without dedup or the pre-screen pass straight through
+                Stage("dedup", _timed("dedup", by_run("dedup"), batch=True), 1,
+                      batch_size=DEDUP_BATCH_SIZE, batch_wait=DEDUP_BATCH_WAIT_SECONDS, batched=True),
+                Stage("prescreen", _timed("prescreen", by_run("prescreen"), batch=True), 1,
+                      batch_size=PRESCREEN_BATCH_SIZE, batch_wait=PRESCREEN_BATCH_WAIT_SECONDS, batched=True),
+                evaluate,
+                Stage("persist", persist, workers["persist"],
+                      batch_size=PERSIST_BATCH_SIZE, batch_wait=PERSIST_FLUSH_SECONDS),
+            ], on_error)
+        finally:
+            db.close()
+            with self._runs_lock:
+                runs = list(self._runs.values())
+            for run in runs:
+                run.job.flush()
+        return count[0]
+
+    def _finish_jobs(self):
+        for job_id in claim_finished_jobs(self.worker_id):
+            db = SessionLocal()
+            try:
+                run = self._run(job_id, db)
+                if run is None:
+                    continue
+                run.finish(db)
+            except Exception as e:
+                self._fail(db, job_id, e)
+            finally:
+                db.close()
+
+    def _drop_finished_runs(self):
+        """Forget runs of jobs that finished, logging this worker's share of the totals."""
+        with self._runs_lock:
+            job_ids = list(self._runs)
+        if not job_ids:
+            return
+        db = SessionLocal()
+        try:
+            finished = {
+                job_id for (job_id,) in db.query(ScreeningJob.id).filter(
+                    ScreeningJob.id.in_(job_ids),
+                    ScreeningJob.status.in_(("DONE", "FAILED"))
+                )
+            }
+        finally:
+            db.close()
+        for job_id in finished:
+            with self._runs_lock:
+                run = self._runs.pop(job_id, None)
+            if run is not None and run.screened:
+                run.summarize()
+                run.job.flush()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(WORKER_LEASE_SECONDS / 3):
+            try:
+                renew_leases(self.worker_id)
+            except Exception as e:
+                print(f"Lease renewal error: {e}")
+
+
+job_worker = JobWorker()
+
+
+if __name__ == "__main__":
+    init_db()
+    if WORKER_METRICS_PORT:
+        from prometheus_client import start_http_server
+        start_http_server(WORKER_METRICS_PORT)
+        print(f"Worker metrics on :{WORKER_METRICS_PORT}/metrics")
+    print(f"Screening worker {job_worker.worker_id} running...")
+    try:
+        job_worker.run_forever()
+    except KeyboardInterrupt:
+        pass